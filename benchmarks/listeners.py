@@ -0,0 +1,365 @@
+"""
+Benchmarks the message listeners that run on every message.
+
+Run it from the root of the repository with `pipenv run benchmark`. A
+`config.yml` file is needed, like when running the bot.
+
+Every listener is timed relative to a reference listener run in the same
+rounds, so results don't depend on how fast or busy the machine is. These
+relative times are compared with `benchmarks/baseline.json`, pass
+`--save-baseline` to overwrite it. The baseline should only be saved in
+commits that just update it, not with the change that is being measured.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+from bot import constants
+from bot.bot import Bot
+from bot.cogs.antivirus import AntiMalwareCog
+from bot.cogs.filter import FilterCog
+from bot.utils.word_filter import WordMatcher
+
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+# How much slower than the baseline a listener can be, relative to the
+# reference listener, before it's reported
+REGRESSION_THRESHOLD = 1.25
+CORPUS_SIZE = 5000
+# The corpus is run this many times, the fastest run and the median
+# relative time are kept, to reduce noise
+ROUNDS = 5
+SEED = 1234
+
+Listener = Callable[["FakeMessage"], Awaitable[None]]
+
+REFERENCE_LISTENER = "reference"
+# Searched by the reference listener, like a simple word filter would
+REFERENCE_REGEX = re.compile(
+    r"\b(?:spam|scam|free nitro|discord\.gift)\b",
+    flags=re.IGNORECASE
+)
+
+
+class FakeRole:
+    """Stands in for `discord.Role`."""
+
+    def __init__(self, role_id: int) -> None:
+        """Sets up the role."""
+        self.id = role_id
+
+
+class FakeMember:
+    """Stands in for `discord.Member`."""
+
+    def __init__(self, member_id: int, roles: List[FakeRole]) -> None:
+        """Sets up the member."""
+        self.id = member_id
+        self.roles = roles
+        self.mention = f"<@{member_id}>"
+
+    def __str__(self) -> str:
+        """Returns the name of the member."""
+        return f"member#{self.id % 10000:04}"
+
+
+class FakeAttachment:
+    """Stands in for `discord.Attachment`."""
+
+    def __init__(self, attachment_id: int, filename: str, size: int) -> None:
+        """Sets up the attachment."""
+        self.id = attachment_id
+        self.filename = filename
+        self.size = size
+        self.url = (
+            f"https://cdn.discordapp.com/attachments/1/{attachment_id}/"
+            f"{filename}"
+        )
+
+
+# First bytes of the files served by `FakeSession`, by extension
+FAKE_FILE_HEADS = {
+    ".png": b"\x89PNG\r\n\x1a\n",
+    ".jpg": b"\xff\xd8\xff\xe0",
+    ".mp4": b"\x00\x00\x00\x18ftypmp42",
+    ".gif": b"GIF89a",
+    ".txt": b"hello",
+    ".py": b"import os",
+    ".exe": b"MZ\x90\x00"
+}
+
+
+class FakeStream:
+    """Stands in for `aiohttp.StreamReader`."""
+
+    def __init__(self, data: bytes) -> None:
+        """Sets up the stream."""
+        self.data = data
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        """Yields the data in chunks."""
+        for start in range(0, len(self.data), size):
+            yield self.data[start:start + size]
+
+
+class FakeResponse:
+    """Stands in for `aiohttp.ClientResponse`."""
+
+    def __init__(self, url: str) -> None:
+        """Sets up the response."""
+        _, extension = os.path.splitext(url)
+        self.content = FakeStream(
+            FAKE_FILE_HEADS[extension].ljust(8192, b"\0")
+        )
+
+    async def __aenter__(self) -> "FakeResponse":
+        """Returns the response."""
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        """Does nothing."""
+
+    def raise_for_status(self) -> None:
+        """Does nothing, the fake files always exist."""
+
+
+class FakeSession:
+    """Stands in for `aiohttp.ClientSession`, serving fake files."""
+
+    def get(self, url: str, **kwargs: object) -> FakeResponse:
+        """Returns the first bytes of a fake file."""
+        return FakeResponse(url)
+
+
+class FakeChannel:
+    """Stands in for `discord.TextChannel`, discarding what is sent."""
+
+    async def send(self, *args: object, **kwargs: object) -> None:
+        """Discards a message."""
+
+
+class FakeMessage:
+    """Stands in for `discord.Message`."""
+
+    def __init__(
+        self,
+        message_id: int,
+        content: str,
+        author: FakeMember,
+        attachments: List[FakeAttachment]
+    ) -> None:
+        """Sets up the message."""
+        self.id = message_id
+        self.content = content
+        self.author = author
+        self.attachments = attachments
+        self.embeds = []
+        self.guild = True
+        self.channel = FakeChannel()
+
+    async def delete(self) -> None:
+        """Pretends to delete the message."""
+
+
+def random_words(rng: random.Random, count: int) -> str:
+    """Returns random lowercase words separated by spaces."""
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        for _ in range(count)
+    )
+
+
+def generate_corpus(size: int, seed: int) -> List[FakeMessage]:
+    """
+    Generates messages similar to the ones sent in the server.
+
+    Most messages are short chat messages, the rest are code blocks, long
+    pastes, Unicode-heavy text and messages with attachments.
+    """
+    rng = random.Random(seed)
+    members = [
+        FakeMember(rng.getrandbits(60), [FakeRole(rng.getrandbits(60))])
+        for _ in range(200)
+    ]
+    members.append(FakeMember(1, [FakeRole(constants.Roles.admins)]))
+    unicode_characters = "ａｂｃ𝐛𝐚𝐝аеорсх​‍é̸ñüß😀🐍✨"
+    extensions = [".png", ".jpg", ".mp4", ".gif", ".txt", ".py", ".exe"]
+
+    corpus = []
+    for message_id in range(size):
+        kind = rng.random()
+        attachments = []
+        if kind < 0.70:
+            content = random_words(rng, rng.randint(1, 15))
+        elif kind < 0.80:
+            content = (
+                f"```py\n{random_words(rng, rng.randint(20, 120))}\n```"
+            )
+        elif kind < 0.85:
+            content = random_words(rng, rng.randint(500, 700))
+        elif kind < 0.93:
+            content = "".join(
+                rng.choice(unicode_characters + string.ascii_lowercase)
+                for _ in range(rng.randint(10, 300))
+            )
+        else:
+            content = random_words(rng, rng.randint(0, 5))
+            attachments = [
+                FakeAttachment(
+                    rng.getrandbits(60),
+                    f"file{index}{rng.choice(extensions)}",
+                    rng.randint(1_000, 50_000_000)
+                )
+                for index in range(rng.randint(1, 4))
+            ]
+        if rng.random() < 0.05:
+            content = constants.Bot.prefix + content
+        corpus.append(FakeMessage(
+            message_id, content, rng.choice(members), attachments
+        ))
+    return corpus
+
+
+async def reference_listener(message: "FakeMessage") -> None:
+    """Does a fixed amount of work per message, that never changes."""
+    REFERENCE_REGEX.search(message.content)
+
+
+def summarize(
+    runs: List[List[float]],
+    reference_runs: List[List[float]]
+) -> Dict[str, float]:
+    """
+    Returns the stats of a listener.
+
+    Throughput and latencies are the ones of the fastest run. The relative
+    time is how many times longer than the reference listener it took, the
+    median of the rounds.
+    """
+    latencies = sorted(min(runs, key=sum))
+    return {
+        "messages_per_second": len(latencies) / sum(latencies),
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "relative_time": statistics.median(
+            sum(run) / sum(reference_run)
+            for run, reference_run in zip(runs, reference_runs)
+        )
+    }
+
+
+async def measure(
+    listener: Listener,
+    corpus: List[FakeMessage]
+) -> List[float]:
+    """Runs a listener on every message, returning the latencies."""
+    latencies = []
+    for message in corpus:
+        start = time.perf_counter()
+        await listener(message)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def create_listeners() -> Dict[str, Listener]:
+    """Creates the listeners, with empty caches."""
+    rng = random.Random(SEED)
+    filter_cog = FilterCog()
+    filter_cog.scanner.matcher = WordMatcher(
+        random_words(rng, 2000).split()
+        + [f"*{word}*" for word in random_words(rng, 200).split()]
+    )
+    bot = Bot(command_prefix=constants.Bot.prefix)
+    bot.http_session = FakeSession()
+    anti_malware_cog = AntiMalwareCog(bot)
+
+    async def process_commands(message: FakeMessage) -> None:
+        """Skips command processing, which isn't benchmarked here."""
+
+    bot.process_commands = process_commands
+
+    return {
+        REFERENCE_LISTENER: reference_listener,
+        "Bot.on_message": bot.on_message,
+        "FilterCog.on_message": filter_cog.on_message,
+        "AntiMalwareCog.on_message": anti_malware_cog.on_message
+    }
+
+
+async def run_benchmarks() -> Dict[str, Dict[str, float]]:
+    """Benchmarks every listener with the same corpus."""
+    corpus = generate_corpus(CORPUS_SIZE, SEED)
+    runs = {}
+    for _ in range(ROUNDS):
+        for name, listener in create_listeners().items():
+            runs.setdefault(name, []).append(
+                await measure(listener, corpus)
+            )
+            # Stops worker processes started by the cog
+            cog = getattr(listener, "__self__", None)
+            cog_unload = getattr(cog, "cog_unload", None)
+            if cog_unload is not None:
+                cog_unload()
+    reference_runs = runs.pop(REFERENCE_LISTENER)
+    return {
+        name: summarize(latencies, reference_runs)
+        for name, latencies in runs.items()
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]]) -> bool:
+    """Prints the results, returning False if any listener regressed."""
+    baseline = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text())
+
+    passed = True
+    for name, stats in results.items():
+        line = (
+            f"{name:<28} {stats['messages_per_second']:>12.0f} msg/s  "
+            f"p50 {stats['p50_us']:>9.1f} us  p99 {stats['p99_us']:>9.1f} us"
+        )
+        line += f"  {stats['relative_time']:>7.2f}x the reference"
+        previous = baseline.get(name)
+        if previous is not None and "relative_time" in previous:
+            ratio = stats["relative_time"] / previous["relative_time"]
+            line += f"  ({ratio:.2f}x the baseline)"
+            if ratio > REGRESSION_THRESHOLD:
+                line += "  REGRESSION"
+                passed = False
+        print(line)
+    return passed
+
+
+def main() -> None:
+    """Runs the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="save the results as the new baseline"
+    )
+    arguments = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    results = asyncio.get_event_loop().run_until_complete(run_benchmarks())
+
+    if arguments.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=4) + "\n")
+        print(f"Baseline saved to {BASELINE_PATH}.")
+    elif not compare_with_baseline(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import logging
 import sys
-from os import listdir
 
 from bot import constants
 from bot.bot import Bot
@@ -32,18 +31,6 @@ bot = Bot(
     )
 )
 
-cogs = [
-    f[:-3] for f in listdir("bot/cogs")
-    if f.endswith(".py")
-]
-moderation_cogs = [
-    f[:-3] for f in listdir("bot/cogs/moderation")
-    if f.endswith(".py")
-]
-
-for cog in cogs:
-    bot.load_extension(f"bot.cogs.{cog}")
-for cog in moderation_cogs:
-    bot.load_extension(f"bot.cogs.moderation.{cog}")
+bot.load_extensions(constants.Bot.extensions)
 
 bot.run(constants.Bot.token)
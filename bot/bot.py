@@ -1,11 +1,18 @@
+import asyncio
 import logging
+import time
+from typing import Any, Dict, Optional
 
-import asyncpg
+import aiohttp
 
 from bot import constants
+from bot.database import Database
+from bot.utils.log_dispatcher import LogDispatcher
+from bot.utils.permissions import PermissionIndex
 
-from discord import Message
+from discord import Member, Message, Role
 from discord.ext import commands
+from discord.ext.commands import Cog
 
 logger = logging.getLogger(__name__)
 
@@ -13,12 +20,122 @@ logger = logging.getLogger(__name__)
 class Bot(commands.Bot):
     """Represents the community's Discord Bot."""
 
-    async def on_ready(self) -> None:
-        """Called when the bot has successfully connected to Discord."""
-        # Set up database connection
-        self.database_connection = await asyncpg.connect(
-            constants.Bot.database_url
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Sets up the bot."""
+        super().__init__(*args, **kwargs)
+        self.database = Database(
+            constants.Bot.database_url,
+            min_size=constants.Database.pool_min_size,
+            max_size=constants.Database.pool_max_size,
+            statement_cache_size=constants.Database.statement_cache_size
         )
+        # Everything sent to log channels goes through this
+        self.log_dispatcher = LogDispatcher(
+            self,
+            flush_interval=constants.LogDispatcher.flush_interval,
+            max_queue_size=constants.LogDispatcher.max_queue_size
+        )
+        # Shared by everything that makes HTTP requests, created on start
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        self.permissions = PermissionIndex(
+            constants.Bot.member_roles_cache_size
+        )
+        constants.add_reload_listener(self.permissions.rebuild)
+        constants.add_reload_listener(self._reload_log_dispatcher)
+        # Maps extension names to how long loading them took, in seconds
+        self.startup_timings: Dict[str, float] = {}
+        # Set once the `cog_load` hooks of the loaded cogs have been run, cogs
+        # added later have theirs run right away
+        self._cogs_loaded = False
+
+    def _reload_log_dispatcher(self) -> None:
+        """Applies the log dispatcher settings of the reloaded config."""
+        self.log_dispatcher.flush_interval = (
+            constants.LogDispatcher.flush_interval
+        )
+        self.log_dispatcher.max_queue_size = (
+            constants.LogDispatcher.max_queue_size
+        )
+
+    async def start(self, token: str, *, reconnect: bool = True) -> None:
+        """
+        Starts the bot.
+
+        The database pool is created here instead of in `on_ready`, because
+        `on_ready` is called again after every reconnection to the gateway.
+        The `cog_load` hooks of the cogs run concurrently after logging in,
+        before connecting to the gateway.
+        """
+        start = time.perf_counter()
+        await asyncio.gather(self.database.connect(), self.login(token))
+        self.http_session = aiohttp.ClientSession()
+        await asyncio.gather(*(
+            self._run_cog_load(cog) for cog in self.cogs.values()
+        ))
+        self._cogs_loaded = True
+        self._log_startup_timings(time.perf_counter() - start)
+        await self.connect(reconnect=reconnect)
+
+    def add_cog(self, cog: Cog) -> None:
+        """
+        Adds a cog.
+
+        If the bot already started, the `cog_load` hook of the cog is run in
+        the background.
+        """
+        super().add_cog(cog)
+        if self._cogs_loaded:
+            self.loop.create_task(self._run_cog_load(cog))
+
+    async def _run_cog_load(self, cog: Cog) -> None:
+        """
+        Runs the `cog_load` hook of a cog, if it has one.
+
+        Cogs do slow set up (e.g. reading files or querying the database) in
+        this hook instead of in `__init__`, so it doesn't block the others.
+        A failing hook is logged and doesn't stop the bot from starting.
+        """
+        cog_load = getattr(cog, "cog_load", None)
+        if cog_load is None:
+            return
+
+        start = time.perf_counter()
+        try:
+            await cog_load()
+        except Exception:
+            logger.exception(f"cog_load of {cog.qualified_name} failed.")
+        extension = type(cog).__module__
+        self.startup_timings[extension] = (
+            self.startup_timings.get(extension, 0.0)
+            + time.perf_counter() - start
+        )
+
+    def _log_startup_timings(self, total: float) -> None:
+        """Logs how long loading every extension took, slowest first."""
+        report = "\n".join(
+            f"{timing * 1000:8.1f} ms  {extension}"
+            for extension, timing in sorted(
+                self.startup_timings.items(),
+                key=lambda item: item[1],
+                reverse=True
+            )
+        )
+        logger.info(
+            f"Started in {total * 1000:.0f} ms, time spent loading every "
+            f"extension:\n{report}"
+        )
+
+    async def close(self) -> None:
+        """
+        Closes the connection to Discord, the HTTP session and the pool.
+
+        Queued log entries are sent first.
+        """
+        await self.log_dispatcher.close()
+        await super().close()
+        if self.http_session is not None:
+            await self.http_session.close()
+        await self.database.close()
 
     async def on_message(self, message: Message) -> None:
         """
@@ -34,12 +151,34 @@ class Bot(commands.Bot):
 
         await self.process_commands(message)
 
+    async def on_member_update(self, before: Member, after: Member) -> None:
+        """Forgets the cached roles of a member, they may have changed."""
+        self.permissions.forget_member(after.id)
+
+    async def on_member_remove(self, member: Member) -> None:
+        """Forgets the cached roles of a member that left."""
+        self.permissions.forget_member(member.id)
+
+    async def on_guild_role_delete(self, role: Role) -> None:
+        """Forgets the cached roles of every member, one was deleted."""
+        self.permissions.forget_all_members()
+
     def load_extension(self, extension: str) -> None:
         """
         Loads an extension.
 
-        The only reason this method exists is to log what extension was
-        loaded.
+        This method exists to log what extension was loaded and how long
+        importing and setting it up took.
         """
+        start = time.perf_counter()
         super().load_extension(extension)
+        self.startup_timings[extension] = time.perf_counter() - start
         logger.info(f"Extension loaded: {extension}")
+
+    def load_extensions(self, manifest: Dict[str, bool]) -> None:
+        """Loads the extensions that are enabled in a manifest."""
+        for extension, enabled in manifest.items():
+            if enabled:
+                self.load_extension(extension)
+            else:
+                logger.info(f"Extension disabled: {extension}")
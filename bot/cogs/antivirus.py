@@ -1,10 +1,18 @@
+import asyncio
 import logging
+from datetime import datetime
 from os.path import splitext
+from typing import FrozenSet, List, Optional
+
+import aiohttp
 
 from bot.bot import Bot
-from bot.constants import Colors, Roles, WhitelistedFileExtensions
+from bot.constants import AntiMalware, Colors, WhitelistedFileExtensions
+from bot.utils.bloom import BloomFilter
+from bot.utils.checks import has_configured_role
+from bot.utils.sniffing import AttachmentSniffer, SniffResult, extensions_of
 
-from discord import Embed, Message
+from discord import Attachment, Embed, Message
 from discord.ext import commands
 
 logger = logging.getLogger(__name__)
@@ -14,34 +22,78 @@ NOT_ALLOWED_FILE_EXTENSION_MSG = (
     "We only allow these file types: **{}.** If you was trying to attach a "
     "source code file, please, use a pasting service."
 )
+BLOCKLISTED_FILE_MSG = (
+    "{}, your message was deleted because it has a file that is known to be "
+    "malicious."
+)
 
 
 class AntiMalwareCog(commands.Cog):
     """Has a message listener that checks for malicious file extensions."""
 
+    def __init__(self, bot: Bot) -> None:
+        """Sets up the cog."""
+        self.bot = bot
+        self.sniffer = AttachmentSniffer(AntiMalware.sniff_cache_size)
+        # Fingerprints of known malicious files, so the database is only
+        # queried for files that are probably in the blocklist
+        self._blocklist_filter = BloomFilter(
+            AntiMalware.blocklist_capacity,
+            AntiMalware.blocklist_error_rate
+        )
+
+    async def cog_load(self) -> None:
+        """Loads the fingerprints of the blocklist into the Bloom filter."""
+        fingerprints = await self.bot.database.fetch(
+            "SELECT fingerprint FROM attachment_blocklist"
+        )
+        for fingerprint in fingerprints:
+            self._blocklist_filter.add(fingerprint["fingerprint"])
+        logger.info(
+            f"{len(fingerprints)} blocklisted file fingerprints loaded."
+        )
+
     @commands.Cog.listener()
     async def on_message(self, message: Message) -> None:
-        """Checks blacklisted file extensions."""
+        """
+        Checks blacklisted file extensions.
+
+        The extension of every attachment must be whitelisted, and its
+        content must not look like a file of a type that isn't whitelisted
+        (e.g. an executable). Attachments that pass these checks must not be
+        in the blocklist.
+        """
         if not message.guild or not message.attachments:
             return
 
         # Check if the user has Administrator role
-        for role in message.author.roles:
-            if role.id == Roles.admins or role.id == Roles.owner:
-                return
+        if self.bot.permissions.is_admin(message.author):
+            return
 
+        whitelist = self.bot.permissions.whitelisted_extensions
         for attachment in message.attachments:
             _, extension = splitext(attachment.url)
-            if extension.lower() not in WhitelistedFileExtensions.whitelist:
+            if extension.lower() not in whitelist:
                 break
         else:
-            return
+            # All the attachments are checked concurrently
+            results = await asyncio.gather(
+                *(
+                    self._sniff(attachment)
+                    for attachment in message.attachments
+                )
+            )
+            extension = self._find_disguised_attachment(results, whitelist)
+            if extension is None:
+                if await self._has_blocklisted_attachment(results):
+                    await self._delete_blocklisted_message(message)
+                return
 
         await message.delete()
 
         logger.info((
             f"{message.author} ({message.author.id}) sent a file with a "
-            f"blacklisted extension ({extension})."
+            f"blacklisted extension or type ({extension})."
         ))
 
         embed = Embed(
@@ -54,7 +106,127 @@ class AntiMalwareCog(commands.Cog):
         )
         await message.channel.send(embed=embed)
 
+    def _find_disguised_attachment(
+        self,
+        results: List[Optional[SniffResult]],
+        whitelist: FrozenSet[str]
+    ) -> Optional[str]:
+        """
+        Returns the type of an attachment whose content isn't whitelisted.
+
+        Only attachments detected as a type without whitelisted extensions
+        (executables, archives and scripts) are disguised. A whitelisted type
+        named as another one (e.g. a PNG saved as `.jpg`) isn't, and neither
+        are attachments of unknown types or that couldn't be downloaded.
+        None is returned if no attachment is disguised.
+        """
+        for result in results:
+            if result is None or result.file_type is None:
+                continue
+            if extensions_of(result.file_type).isdisjoint(whitelist):
+                return result.file_type
+        return None
+
+    async def _has_blocklisted_attachment(
+        self,
+        results: List[Optional[SniffResult]]
+    ) -> bool:
+        """Returns True if any attachment is in the blocklist."""
+        for result in results:
+            if result is None:
+                continue
+            if result.fingerprint not in self._blocklist_filter:
+                continue
+            if await self.bot.database.fetchval(
+                """
+                SELECT EXISTS(
+                    SELECT 1 FROM attachment_blocklist WHERE fingerprint = $1
+                )
+                """,
+                result.fingerprint
+            ):
+                return True
+        return False
+
+    async def _delete_blocklisted_message(self, message: Message) -> None:
+        """Deletes a message with a blocklisted attachment."""
+        await message.delete()
+
+        logger.info((
+            f"{message.author} ({message.author.id}) sent a blocklisted "
+            "file."
+        ))
+
+        embed = Embed(
+            color=Colors.red,
+            description=BLOCKLISTED_FILE_MSG.format(message.author.mention)
+        )
+        await message.channel.send(embed=embed)
+
+    async def _sniff(self, attachment: Attachment) -> Optional[SniffResult]:
+        """Sniffs an attachment, returning None if it can't be downloaded."""
+        try:
+            return await self.sniffer.sniff(self.bot.http_session, attachment)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            logger.warning(f"Could not sniff {attachment.url}: {error}")
+            return None
+
+    @commands.group(name="blocklist")
+    @has_configured_role("moderators")
+    async def blocklist(self, ctx: commands.Context) -> None:
+        """A group of commands for managing the file blocklist."""
+        if ctx.invoked_subcommand is None:
+            await ctx.send_help(ctx.command)
+
+    @blocklist.command(name="add")
+    async def add(
+        self,
+        ctx: commands.Context,
+        message: Message,
+        *,
+        reason: str = "No reason specified."
+    ) -> None:
+        """Adds the files attached to a message to the blocklist."""
+        if not message.attachments:
+            raise commands.errors.BadArgument(
+                "That message has no attachments."
+            )
+
+        results = await asyncio.gather(
+            *(self._sniff(attachment) for attachment in message.attachments)
+        )
+        fingerprints = [
+            result.fingerprint for result in results if result is not None
+        ]
+        if not fingerprints:
+            raise commands.errors.BadArgument(
+                "The attachments of that message couldn't be downloaded."
+            )
+
+        inserted_at = datetime.now()
+        await self.bot.database.executemany(
+            """
+            INSERT INTO attachment_blocklist (
+                fingerprint, moderator_id, inserted_at, reason
+            ) VALUES (
+                $1, $2, $3, $4
+            )
+            ON CONFLICT DO NOTHING
+            """,
+            [
+                (fingerprint, ctx.author.id, inserted_at, reason)
+                for fingerprint in fingerprints
+            ]
+        )
+        for fingerprint in fingerprints:
+            self._blocklist_filter.add(fingerprint)
+
+        await ctx.send(
+            f":white_check_mark: {len(fingerprints)} of "
+            f"{len(message.attachments)} files added to the blocklist."
+        )
+
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
-    bot.add_cog(AntiMalwareCog())
+    bot.add_cog(AntiMalwareCog(bot))
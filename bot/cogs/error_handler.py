@@ -82,7 +82,6 @@ class ErrorHandler(commands.Cog):
         """Handles any other error."""
         await ctx.send(":x: Sorry, an unexpected error happened.")
         # Send error report to an internal error channel.
-        errors_channel = ctx.guild.get_channel(Channels.errors)
         core_dev_role = ctx.guild.get_role(Roles.core_developers)
         core_developers_allowed_mention = AllowedMentions(
             everyone=False,
@@ -122,10 +121,11 @@ class ErrorHandler(commands.Cog):
             """),
             inline=False
         )
-        await errors_channel.send(
-            f"{core_dev_role.mention}",
-            allowed_mentions=core_developers_allowed_mention,
-            embed=embed
+        self.bot.log_dispatcher.send(
+            Channels.errors,
+            embed,
+            content=core_dev_role.mention,
+            allowed_mentions=core_developers_allowed_mention
         )
 
 
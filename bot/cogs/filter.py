@@ -1,21 +1,93 @@
+import asyncio
+import hashlib
+import logging
 import re
+import textwrap
+import time
+from typing import Optional, Pattern
 
 from bot.bot import Bot
-from bot.constants import Bot as Bot_constants
+from bot.constants import (
+    Bot as Bot_constants, Colors, Filter, add_reload_listener,
+    remove_reload_listener
+)
+from bot.utils.cache import LRUCache
+from bot.utils.checks import has_configured_role
+from bot.utils.scanning import ScanExecutor
+from bot.utils.word_filter import WordMatcher, load_word_matcher
 
-from discord import Message
+from discord import Embed, Message
 from discord.ext import commands
 
 
+logger = logging.getLogger(__name__)
+
+
+def _compile_bad_words() -> Optional[Pattern]:
+    """Compiles the offensive words regex of the config, if there is one."""
+    if not Bot_constants.offensive_words_regex:
+        return None
+    return re.compile(
+        Bot_constants.offensive_words_regex,
+        flags=re.IGNORECASE
+    )
+
+
 class FilterCog(commands.Cog):
     """Cog that filters and deletes messages with offensive content."""
 
     def __init__(self) -> None:
         """Sets up the cog."""
-        self.bad_words = re.compile(
-            Bot_constants.offensive_words_regex,
-            flags=re.IGNORECASE
+        # The offensive words are loaded in `cog_load`
+        self.scanner = ScanExecutor(
+            WordMatcher(()),
+            _compile_bad_words(),
+            offload_threshold=Filter.offload_threshold,
+            workers=Filter.offload_workers,
+            timeout=Filter.scan_timeout
         )
+        # Maps digests of message contents to whether they are offensive, so
+        # spam is only normalized and scanned once
+        self._verdicts = LRUCache(Filter.verdict_cache_size)
+
+        self._started_at = time.perf_counter()
+        self._scanned_messages = 0
+        self._scanned_characters = 0
+        self._matched_messages = 0
+        self._scan_time = 0.0
+        self._cached_verdicts = 0
+        add_reload_listener(self._apply_config)
+
+    def _apply_config(self) -> None:
+        """Applies the filter settings of the reloaded config."""
+        self.scanner.offload_threshold = Filter.offload_threshold
+        self.scanner.timeout = Filter.scan_timeout
+        bad_words = _compile_bad_words()
+        if bad_words != self.scanner.bad_words:
+            self.scanner.update(self.scanner.matcher, bad_words)
+            self._verdicts.clear()
+
+    def _load_matcher(self) -> WordMatcher:
+        """Builds the word matcher from the offensive words file."""
+        try:
+            return load_word_matcher(Bot_constants.offensive_words_file)
+        except FileNotFoundError:
+            logger.warning(
+                f"{Bot_constants.offensive_words_file} not found, no "
+                "offensive words will be filtered."
+            )
+            return WordMatcher(())
+
+    async def cog_load(self) -> None:
+        """Loads the offensive words file, without blocking the loop."""
+        loop = asyncio.get_event_loop()
+        matcher = await loop.run_in_executor(None, self._load_matcher)
+        self.scanner.update(matcher, self.scanner.bad_words)
+
+    def cog_unload(self) -> None:
+        """Stops the scan worker processes."""
+        remove_reload_listener(self._apply_config)
+        self.scanner.shutdown()
 
     @commands.Cog.listener()
     async def on_message(self, message: Message) -> None:
@@ -33,14 +105,104 @@ class FilterCog(commands.Cog):
 
         This is overriden to check if a message has offensive content.
         """
+        # Embed updates (e.g. link previews) are edits where the content
+        # didn't change, and the content was already checked
+        if before.content == after.content:
+            return
+
         await self._check_for_offensive_content(after)
 
     async def _check_for_offensive_content(self, message: Message) -> None:
-        """Checks if the message contains offensive content."""
-        if self.bad_words.search(message.content):
+        """
+        Checks if the message contains offensive content.
+
+        A message that couldn't be scanned is kept: a scan only times out
+        when the configured regex backtracks, which says nothing about the
+        message, and deleting it would let the regex silence anyone. Its
+        content is logged instead so that it can be reviewed by hand.
+        """
+        offensive = await self.is_offensive(message.content)
+        if offensive is None:
+            logger.warning(
+                f"Could not check message {message.id} of {message.author} "
+                f"({message.author.id}), it was kept for review: "
+                f"{message.jump_url}\n{textwrap.shorten(message.content, 500)}"
+            )
+        elif offensive:
             # bot/cogs/moderation/message_log.py will handle this
             await message.delete()
 
+    async def is_offensive(self, content: str) -> Optional[bool]:
+        """
+        Returns True if the content has offensive words.
+
+        The content is normalized before being scanned, to catch offensive
+        words hidden with lookalike characters, invisible characters or
+        leetspeak. Returns None if the content couldn't be scanned, which
+        isn't cached, so the content is scanned again next time.
+        """
+        digest = hashlib.blake2b(content.encode(), digest_size=16).digest()
+        offensive = self._verdicts.get(digest)
+        if offensive is not None:
+            self._cached_verdicts += 1
+            return offensive
+
+        start = time.perf_counter()
+        offensive = await self.scanner.is_offensive(content)
+        if offensive is None:
+            return None
+        self._verdicts.set(digest, offensive)
+        self._scan_time += time.perf_counter() - start
+        self._scanned_messages += 1
+        self._scanned_characters += len(content)
+        self._matched_messages += offensive
+        return offensive
+
+    @commands.group(name="filter")
+    @has_configured_role("admins")
+    async def filter(self, ctx: commands.Context) -> None:
+        """A group of commands for managing the offensive content filter."""
+        if ctx.invoked_subcommand is None:
+            await ctx.send_help(ctx.command)
+
+    @filter.command(name="reload")
+    async def reload(self, ctx: commands.Context) -> None:
+        """Reloads the offensive words file without restarting the bot."""
+        loop = asyncio.get_event_loop()
+        matcher = await loop.run_in_executor(None, self._load_matcher)
+        self.scanner.update(matcher, self.scanner.bad_words)
+        self._verdicts.clear()
+        await ctx.send(
+            f":white_check_mark: {len(matcher)} offensive words loaded."
+        )
+
+    @filter.command(name="stats")
+    async def stats(self, ctx: commands.Context) -> None:
+        """Shows how many messages the filter scans and how fast."""
+        uptime = time.perf_counter() - self._started_at
+        scan_time = self._scan_time or 1e-9
+        embed = Embed(
+            title="Filter stats",
+            color=Colors.default
+        )
+        embed.add_field(
+            name="Information",
+            value=textwrap.dedent(f"""
+                Words: {len(self.scanner.matcher)}
+                Scanned messages: {self._scanned_messages}
+                Matched messages: {self._matched_messages}
+                Cached verdicts used: {self._cached_verdicts}
+                Inline scans: {self.scanner.inline_scans}
+                Offloaded scans: {self.scanner.offloaded_scans}
+                Timed out scans: {self.scanner.timed_out_scans}
+                Messages per second: {self._scanned_messages / uptime:.2f}
+                Capacity: {self._scanned_messages / scan_time:.0f} messages/s
+                Capacity: {self._scanned_characters / scan_time:.0f} chars/s
+            """),
+            inline=False
+        )
+        await ctx.send(embed=embed)
+
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
@@ -1,15 +1,117 @@
+import asyncio
+import logging
 import textwrap
+from typing import Dict, Optional
 
 from bot.bot import Bot
-from bot.constants import Colors, Emojis, Roles
-from bot.utils.checks import with_role
+from bot.constants import (
+    Colors, Emojis, Information, Roles, add_reload_listener,
+    remove_reload_listener
+)
+from bot.utils.checks import has_configured_role, with_role
+from bot.utils.member_counters import MemberCounters
 
-from discord import Embed, Member, Role, Status, TextChannel
+from discord import Embed, Guild, Member, Role, Status, TextChannel
 from discord.ext import commands
 
 
+logger = logging.getLogger(__name__)
+
+
 class InformationCog(commands.Cog):
-    """Has commands related to member and server information."""
+    """
+    Has commands related to member and server information.
+
+    Member counts of the server command are kept up to date from member
+    events, and are recounted every `counters_reconcile_interval` seconds.
+    """
+
+    def __init__(self, bot: Bot) -> None:
+        """Sets up the cog."""
+        self.bot = bot
+        # Maps guild IDs to their member counters
+        self._counters: Dict[int, MemberCounters] = {}
+        self._reconcile_task: Optional[asyncio.Task] = None
+        add_reload_listener(self._apply_config)
+
+    def _apply_config(self) -> None:
+        """Counts the members again, in case the tracked roles changed."""
+        for guild in self.bot.guilds:
+            self._rebuild_counters(guild)
+
+    async def cog_load(self) -> None:
+        """Starts recounting the members periodically."""
+        self._reconcile_task = self.bot.loop.create_task(
+            self._reconcile_counters()
+        )
+
+    def cog_unload(self) -> None:
+        """Stops recounting the members."""
+        remove_reload_listener(self._apply_config)
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+
+    async def _reconcile_counters(self) -> None:
+        """Recounts the members of every guild, periodically."""
+        await self.bot.wait_until_ready()
+        while True:
+            for guild in self.bot.guilds:
+                self._rebuild_counters(guild)
+            await asyncio.sleep(Information.counters_reconcile_interval)
+
+    def _rebuild_counters(self, guild: Guild) -> MemberCounters:
+        """Counts the members of a guild again."""
+        counters = self._counters.get(guild.id)
+        tracked_role_ids = (Roles.staff, Roles.trial_staff)
+        if (
+            counters is None
+            or counters.tracked_role_ids != frozenset(tracked_role_ids)
+        ):
+            # The config was reloaded with other roles
+            counters = self._counters[guild.id] = MemberCounters(
+                tracked_role_ids
+            )
+            counters.rebuild(guild.members)
+        elif counters.rebuild(guild.members):
+            logger.info(f"Member counters of {guild} drifted, recounted.")
+        return counters
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: Member) -> None:
+        """Counts a member that joined."""
+        counters = self._counters.get(member.guild.id)
+        if counters is not None:
+            counters.add(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: Member) -> None:
+        """Stops counting a member that left."""
+        counters = self._counters.get(member.guild.id)
+        if counters is not None:
+            counters.remove(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: Member, after: Member) -> None:
+        """
+        Updates the counts after the roles or the status of a member changed.
+
+        discord.py 1.x dispatches status changes here.
+        """
+        counters = self._counters.get(after.guild.id)
+        if counters is not None:
+            counters.update(before, after)
+
+    @commands.Cog.listener()
+    async def on_presence_update(self, before: Member, after: Member) -> None:
+        """
+        Updates the counts after the status of a member changed.
+
+        Newer versions of discord.py dispatch status changes here instead of
+        in `on_member_update`.
+        """
+        counters = self._counters.get(after.guild.id)
+        if counters is not None:
+            counters.update(before, after)
 
     @commands.command(name="user", aliases=("member",))
     async def user(self, ctx: commands.Context, member: Member = None) -> None:
@@ -62,26 +164,16 @@ class InformationCog(commands.Cog):
             "offline": Emojis.status_offline
         }
 
-        online_members = 0
-        idle_members = 0
-        dnd_members = 0
-        offline_members = 0
-
-        for member in ctx.guild.members:
-            if member.status is Status.online:
-                online_members += 1
-            elif member.status is Status.idle:
-                idle_members += 1
-            elif member.status is Status.dnd:
-                dnd_members += 1
-            elif member.status is Status.offline:
-                offline_members += 1
-        staff_members = len(
-            ctx.guild.get_role(Roles.staff).members
-        )
-        trial_staff_members = len(
-            ctx.guild.get_role(Roles.trial_staff).members
-        )
+        counters = self._counters.get(ctx.guild.id)
+        if counters is None:
+            # The counters are built once the bot is ready
+            counters = self._rebuild_counters(ctx.guild)
+        online_members = counters.statuses[Status.online]
+        idle_members = counters.statuses[Status.idle]
+        dnd_members = counters.statuses[Status.dnd]
+        offline_members = counters.statuses[Status.offline]
+        staff_members = counters.roles[Roles.staff]
+        trial_staff_members = counters.roles[Roles.trial_staff]
 
         server_information = Embed(
             title=f"{ctx.guild.name}",
@@ -107,7 +199,7 @@ class InformationCog(commands.Cog):
         server_information.add_field(
             name="Members count",
             value=textwrap.dedent(f"""
-                Members: {len(ctx.guild.members)}
+                Members: {counters.members}
                 Staff members: {staff_members}
                 Trial staff members: {trial_staff_members}
             """),
@@ -127,7 +219,7 @@ class InformationCog(commands.Cog):
         await ctx.send(embed=server_information)
 
     @commands.command(name="role")
-    @commands.has_role(Roles.staff)
+    @has_configured_role("staff")
     async def role(self, ctx: commands.Context, role: Role) -> None:
         """Shows information about a role."""
         role_information = Embed(
@@ -154,7 +246,7 @@ class InformationCog(commands.Cog):
         await ctx.send(embed=role_information)
 
     @commands.command(name="channel")
-    @commands.has_role(Roles.staff)
+    @has_configured_role("staff")
     async def channel(
         self,
         ctx: commands.Context,
@@ -179,4 +271,4 @@ class InformationCog(commands.Cog):
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
-    bot.add_cog(InformationCog())
+    bot.add_cog(InformationCog(bot))
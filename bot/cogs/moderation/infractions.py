@@ -1,17 +1,34 @@
+import asyncio
+import io
 import logging
+import re
 import textwrap
+import time
 from datetime import datetime
-from typing import Literal, Optional
+from functools import partial
+from typing import List, Literal, Optional, Set
 
 from bot.bot import Bot
-from bot.constants import Channels, Colors, Roles
+from bot.constants import Channels, Colors, Database, Moderation
+from bot.utils.actions import ActionPipeline
+from bot.utils.cache import LRUCache
+from bot.utils.checks import has_configured_role
 
-from discord import Embed, HTTPException, Member
+from discord import Embed, File, HTTPException, Member, Object, User
 from discord.ext import commands
 
 
 logger = logging.getLogger(__name__)
 
+# How many infractions are shown per page of the infractions command
+INFRACTIONS_PER_PAGE = 10
+
+# Matches user IDs in files attached to mass action commands
+USER_ID_REGEX = re.compile(r"\b\d{15,20}\b")
+
+# How often the progress of mass actions is reported, in seconds
+MASS_ACTION_PROGRESS_INTERVAL = 5
+
 
 class InfractionsCog(commands.Cog):
     """Applies and pardones infractions."""
@@ -19,6 +36,84 @@ class InfractionsCog(commands.Cog):
     def __init__(self, bot: Bot) -> None:
         """Sets up the cog."""
         self.bot = bot
+        self.infractions_writer = bot.database.create_writer(
+            """
+            INSERT INTO infractions (
+                moderator_id, bad_actor_id, action, inserted_at, expires_at,
+                reason
+            ) VALUES (
+                $1, $2, $3, $4, $5, $6
+            )
+            """,
+            batch_size=Database.write_batch_size,
+            flush_interval=Database.write_flush_interval,
+            max_retries=Database.write_max_retries,
+            max_buffered=Database.write_max_buffered,
+            on_flush=self._invalidate_history_cache
+        )
+        # Maps bad actor IDs to the first page of their infraction history
+        self._history_cache = LRUCache(Database.history_cache_size)
+        # Maps bad actor IDs to how many times their history was invalidated
+        # while it was being fetched, so a page fetched before an
+        # invalidation isn't cached after it. A missing generation means
+        # that it may have changed.
+        self._history_generations = LRUCache(Database.history_cache_size)
+
+    def cog_unload(self) -> None:
+        """Writes the buffered infractions before the cog is unloaded."""
+        self.bot.loop.create_task(
+            self.bot.database.remove_writer(self.infractions_writer)
+        )
+
+    async def _invalidate_history_cache(self, rows: List[tuple]) -> None:
+        """Forgets the cached history of bad actors with new infractions."""
+        for row in rows:
+            bad_actor_id = row[1]
+            self._history_cache.pop(bad_actor_id)
+            # Only histories that were fetched have a generation
+            generation = self._history_generations.get(bad_actor_id)
+            if generation is not None:
+                self._history_generations.set(bad_actor_id, generation + 1)
+
+    async def fetch_infraction_history(
+        self,
+        bad_actor_id: int,
+        before: Optional[int] = None
+    ) -> list:
+        """
+        Returns a page of the infractions of a bad actor, newest first.
+
+        Pages are fetched by keyset: `before` is the ID of the last
+        infraction of the previous page. The first page is cached.
+        """
+        if before is None:
+            history = self._history_cache.get(bad_actor_id)
+            if history is not None:
+                return history
+        generation = self._history_generations.get(bad_actor_id)
+        if generation is None:
+            generation = 0
+            self._history_generations.set(bad_actor_id, generation)
+
+        history = await self.bot.database.fetch(
+            """
+            SELECT id, moderator_id, action, inserted_at, expires_at, reason
+            FROM infractions
+            WHERE bad_actor_id = $1 AND id < $2
+            ORDER BY id DESC
+            LIMIT $3
+            """,
+            bad_actor_id,
+            before if before is not None else 2 ** 31 - 1,
+            INFRACTIONS_PER_PAGE
+        )
+        # Infractions written while fetching may be missing from the page
+        if (
+            before is None
+            and self._history_generations.get(bad_actor_id) == generation
+        ):
+            self._history_cache.set(bad_actor_id, history)
+        return history
 
     async def save_infraction_into_database(
         self,
@@ -29,18 +124,15 @@ class InfractionsCog(commands.Cog):
         expires_at: Optional[datetime],
         reason: str
     ) -> None:
-        """Saves an infraction into the database."""
-        await self.bot.database_connection.execute(
-            """
-            INSERT INTO infractions (
-                moderator_id, bad_actor_id, action, inserted_at, expires_at,
-                reason
-            ) VALUES (
-                $1, $2, $3, $4, $5, $6
-            )
-            """,
+        """
+        Saves an infraction into the database.
+
+        The infraction is buffered and written in the background, so this
+        doesn't wait for the database.
+        """
+        self.infractions_writer.add((
             moderator_id, bad_actor_id, action, inserted_at, expires_at, reason
-        )
+        ))
 
     async def save_infraction_into_infractions_channel(
         self,
@@ -102,8 +194,7 @@ class InfractionsCog(commands.Cog):
             value=ctx.message.jump_url,
             inline=False
         )
-        infractions_log_channel = ctx.guild.get_channel(Channels.infractions)
-        await infractions_log_channel.send(embed=embed)
+        self.bot.log_dispatcher.send(Channels.infractions, embed)
 
     async def dm_bad_actor(
         self,
@@ -152,7 +243,7 @@ class InfractionsCog(commands.Cog):
             return False
 
     @commands.command(name="kick")
-    @commands.has_role(Roles.moderators)
+    @has_configured_role("moderators")
     async def kick(
         self,
         ctx: commands.Context,
@@ -169,31 +260,67 @@ class InfractionsCog(commands.Cog):
                     "or me."
                 )
             )
-        await self.dm_bad_actor(ctx, bad_actor, Colors.orange, "Kick", reason)
-        reason = textwrap.shorten(reason, 512, placeholder="...")
-        await ctx.guild.kick(bad_actor, reason=reason)
-        await self.save_infraction_into_infractions_channel(
-            ctx,
-            ctx.author,
-            bad_actor,
-            "Kick",
-            datetime.now(),
-            reason
-        )
-        await self.save_infraction_into_database(
-            ctx.author.id,
-            bad_actor.id,
+        shortened_reason = textwrap.shorten(reason, 512, placeholder="...")
+        inserted_at = datetime.now()
+
+        # The bad actor must be DMed before they leave the server, everything
+        # else can be done at the same time once they're gone
+        pipeline = ActionPipeline(f"kick of {bad_actor.id}")
+        pipeline.then(
+            "dm",
+            partial(
+                self.dm_bad_actor,
+                ctx,
+                bad_actor,
+                Colors.orange,
+                "Kick",
+                reason
+            )
+        )
+        pipeline.then(
             "kick",
-            datetime.now(),
-            None,
-            reason
+            partial(ctx.guild.kick, bad_actor, reason=shortened_reason)
         )
-        await ctx.send(
-            f":white_check_mark: Successfully kicked {bad_actor.mention}."
+        pipeline.alongside(
+            "log",
+            partial(
+                self.save_infraction_into_infractions_channel,
+                ctx,
+                ctx.author,
+                bad_actor,
+                "Kick",
+                inserted_at,
+                shortened_reason
+            )
+        )
+        pipeline.alongside(
+            "database",
+            partial(
+                self.save_infraction_into_database,
+                ctx.author.id,
+                bad_actor.id,
+                "kick",
+                inserted_at,
+                None,
+                shortened_reason
+            )
+        )
+        pipeline.alongside(
+            "reply",
+            partial(
+                ctx.send,
+                f":white_check_mark: Successfully kicked {bad_actor.mention}."
+            )
         )
+        await pipeline.run()
+        if pipeline.failures:
+            await ctx.send(
+                ":warning: These steps failed: "
+                f"{', '.join(pipeline.failures)}."
+            )
 
     @commands.command(name="ban")
-    @commands.has_role(Roles.moderators)
+    @has_configured_role("moderators")
     async def ban(
         self,
         ctx: commands.Context,
@@ -210,29 +337,310 @@ class InfractionsCog(commands.Cog):
                     "or me."
                 )
             )
-        await self.dm_bad_actor(ctx, bad_actor, Colors.red, "Ban", reason)
-        reason = textwrap.shorten(reason, 512, placeholder="...")
-        await ctx.guild.ban(bad_actor, reason=reason, delete_message_days=0)
-        await self.save_infraction_into_infractions_channel(
-            ctx,
-            ctx.author,
-            bad_actor,
-            "Ban",
-            datetime.now(),
-            reason
-        )
-        await self.save_infraction_into_database(
-            ctx.author.id,
-            bad_actor.id,
+        shortened_reason = textwrap.shorten(reason, 512, placeholder="...")
+        inserted_at = datetime.now()
+
+        # The bad actor must be DMed before they leave the server, everything
+        # else can be done at the same time once they're gone
+        pipeline = ActionPipeline(f"ban of {bad_actor.id}")
+        pipeline.then(
+            "dm",
+            partial(
+                self.dm_bad_actor,
+                ctx,
+                bad_actor,
+                Colors.red,
+                "Ban",
+                reason
+            )
+        )
+        pipeline.then(
             "ban",
-            datetime.now(),
-            None,
-            reason
+            partial(
+                ctx.guild.ban,
+                bad_actor,
+                reason=shortened_reason,
+                delete_message_days=0
+            )
+        )
+        pipeline.alongside(
+            "log",
+            partial(
+                self.save_infraction_into_infractions_channel,
+                ctx,
+                ctx.author,
+                bad_actor,
+                "Ban",
+                inserted_at,
+                shortened_reason
+            )
+        )
+        pipeline.alongside(
+            "database",
+            partial(
+                self.save_infraction_into_database,
+                ctx.author.id,
+                bad_actor.id,
+                "ban",
+                inserted_at,
+                None,
+                shortened_reason
+            )
+        )
+        pipeline.alongside(
+            "reply",
+            partial(
+                ctx.send,
+                f":white_check_mark: Successfully banned {bad_actor.mention}."
+            )
+        )
+        await pipeline.run()
+        if pipeline.failures:
+            await ctx.send(
+                ":warning: These steps failed: "
+                f"{', '.join(pipeline.failures)}."
+            )
+
+    async def _read_user_ids(
+        self,
+        ctx: commands.Context,
+        user_ids: List[int]
+    ) -> Set[int]:
+        """Returns the user IDs passed and the ones in attached files."""
+        all_user_ids = set(user_ids)
+        for attachment in ctx.message.attachments:
+            content = (await attachment.read()).decode(errors="ignore")
+            all_user_ids.update(
+                int(user_id) for user_id in USER_ID_REGEX.findall(content)
+            )
+        return all_user_ids
+
+    async def _apply_mass_action(
+        self,
+        ctx: commands.Context,
+        action: Literal["kick", "ban"],
+        user_ids: List[int],
+        reason: str
+    ) -> None:
+        """
+        Kicks or bans many users, with a limit of concurrent requests.
+
+        Bad actors aren't DMed, a single summary is sent to the #infractions
+        channel and every infraction is saved with a single bulk insert.
+        No new requests are made once `Moderation.mass_action_timeout`
+        seconds passed, the users that weren't tried yet are reported as timed
+        out. Requests already made are waited for, since they may reach
+        Discord anyway and their outcome has to be saved.
+        """
+        all_user_ids = await self._read_user_ids(ctx, user_ids)
+        if not all_user_ids:
+            raise commands.errors.BadArgument("No user IDs were specified.")
+        if len(all_user_ids) > Moderation.mass_action_max_users:
+            raise commands.errors.BadArgument(
+                f"Only up to {Moderation.mass_action_max_users} users can be "
+                "handled at once."
+            )
+
+        reason = textwrap.shorten(reason, 512, placeholder="...")
+        inserted_at = datetime.now()
+        semaphore = asyncio.Semaphore(Moderation.mass_action_concurrency)
+        succeeded = []
+        failed = []
+        timed_out = []
+        deadline_passed = asyncio.Event()
+
+        async def apply(user_id: int) -> None:
+            member = ctx.guild.get_member(user_id)
+            if member is not None and not self.respects_role_hierarchy(
+                ctx.author, member, ctx.me
+            ):
+                failed.append(user_id)
+                return
+
+            async with semaphore:
+                if deadline_passed.is_set():
+                    timed_out.append(user_id)
+                    return
+                try:
+                    if action == "kick":
+                        await ctx.guild.kick(Object(user_id), reason=reason)
+                    else:
+                        await ctx.guild.ban(
+                            Object(user_id),
+                            reason=reason,
+                            delete_message_days=0
+                        )
+                except HTTPException:
+                    failed.append(user_id)
+                else:
+                    succeeded.append(user_id)
+
+        progress = await ctx.send(
+            f":hourglass: Applying {action} to {len(all_user_ids)} users..."
+        )
+        start = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(apply(user_id)) for user_id in all_user_ids
+        ]
+        deadline = start + Moderation.mass_action_timeout
+        pending = tasks
+        while pending:
+            timeout = min(
+                MASS_ACTION_PROGRESS_INTERVAL,
+                deadline - time.perf_counter()
+            )
+            if timeout <= 0:
+                break
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+            await progress.edit(
+                content=(
+                    f":hourglass: Applying {action} to {len(all_user_ids)} "
+                    f"users... {len(succeeded) + len(failed)} done."
+                )
+            )
+
+        # Users waiting for the semaphore are skipped right away
+        deadline_passed.set()
+        if pending:
+            await asyncio.wait(pending)
+        elapsed = time.perf_counter() - start
+
+        self.infractions_writer.add_many(
+            (ctx.author.id, user_id, action, inserted_at, None, reason)
+            for user_id in succeeded
+        )
+        await self._send_mass_action_summary(
+            ctx, action, succeeded, failed, timed_out, inserted_at, reason
+        )
+        await progress.edit(
+            content=(
+                f":white_check_mark: Applied {action} to {len(succeeded)} "
+                f"users in {elapsed:.1f} seconds. Failed: {len(failed)}. "
+                f"Timed out: {len(timed_out)}."
+            )
+        )
+
+    async def _send_mass_action_summary(
+        self,
+        ctx: commands.Context,
+        action: Literal["kick", "ban"],
+        succeeded: List[int],
+        failed: List[int],
+        timed_out: List[int],
+        inserted_at: datetime,
+        reason: str
+    ) -> None:
+        """Saves a single summary of a mass action into #infractions."""
+        embed = Embed(
+            title="Mass infraction applied",
+            color=Colors.default
+        )
+        embed.add_field(
+            name="Information",
+            value=textwrap.dedent(f"""
+                Type: Mass {action}
+                Moderator: {ctx.author.mention}
+                Moderator ID: {ctx.author.id}
+                Inserted at: {inserted_at}
+                Succeeded: {len(succeeded)}
+                Failed: {len(failed)}
+                Timed out: {len(timed_out)}
+            """),
+            inline=False
+        )
+        embed.add_field(
+            name="Reason",
+            value=reason,
+            inline=False
+        )
+        embed.add_field(
+            name="Context",
+            value=ctx.message.jump_url,
+            inline=False
+        )
+        user_ids = io.BytesIO(
+            "\n".join(str(user_id) for user_id in succeeded).encode()
         )
-        await ctx.send(
-            f":white_check_mark: Successfully banned {bad_actor.mention}."
+        self.bot.log_dispatcher.send(
+            Channels.infractions,
+            embed,
+            file=File(user_ids, filename=f"mass_{action}.txt")
         )
 
+    @commands.command(name="masskick")
+    @has_configured_role("moderators")
+    async def masskick(
+        self,
+        ctx: commands.Context,
+        user_ids: commands.Greedy[int],
+        *,
+        reason: str = "No reason specified."
+    ) -> None:
+        """
+        Kicks many users at once, to respond to raids.
+
+        User IDs can be passed as arguments or in attached text files.
+        """
+        await self._apply_mass_action(ctx, "kick", user_ids, reason)
+
+    @commands.command(name="massban")
+    @has_configured_role("moderators")
+    async def massban(
+        self,
+        ctx: commands.Context,
+        user_ids: commands.Greedy[int],
+        *,
+        reason: str = "No reason specified."
+    ) -> None:
+        """
+        Bans many users at once, to respond to raids.
+
+        User IDs can be passed as arguments or in attached text files.
+        """
+        await self._apply_mass_action(ctx, "ban", user_ids, reason)
+
+    @commands.command(name="infractions", aliases=("infs",))
+    @has_configured_role("staff")
+    async def infractions(
+        self,
+        ctx: commands.Context,
+        user: User,
+        before: Optional[int] = None
+    ) -> None:
+        """
+        Shows the infractions of a user, newest first.
+
+        To see older infractions, pass the ID of the last infraction shown.
+        """
+        history = await self.fetch_infraction_history(user.id, before)
+        if not history:
+            await ctx.send(f":x: No infractions found for {user.mention}.")
+            return
+
+        embed = Embed(
+            title=f"Infractions of {user}",
+            color=Colors.default
+        )
+        for infraction in history:
+            embed.add_field(
+                name=f"#{infraction['id']} - {infraction['action']}",
+                value=textwrap.dedent(f"""
+                    Moderator: <@{infraction['moderator_id']}>
+                    Inserted at: {infraction['inserted_at']}
+                    Expires at: {infraction['expires_at']}
+                    Reason: {infraction['reason']}
+                """),
+                inline=False
+            )
+        if len(history) == INFRACTIONS_PER_PAGE:
+            embed.set_footer(
+                text=(
+                    "To see older infractions, use "
+                    f"{ctx.prefix}infractions {user.id} {history[-1]['id']}"
+                )
+            )
+        await ctx.send(embed=embed)
+
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
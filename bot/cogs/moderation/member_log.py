@@ -1,19 +1,89 @@
+import asyncio
+import io
+import logging
 import textwrap
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 
 from bot.bot import Bot
-from bot.constants import Channels, Colors
+from bot.constants import (
+    Channels, Colors, MemberLog, add_reload_listener, remove_reload_listener
+)
+from bot.utils.rate import SlidingWindowCounter
 
-from discord import Embed, Member
+from discord import Embed, File, Member
 from discord.ext import commands
 
 
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the account age buckets of join digests
+ACCOUNT_AGE_BUCKETS: Tuple[Tuple[timedelta, str], ...] = (
+    (timedelta(hours=1), "Under an hour"),
+    (timedelta(days=1), "Under a day"),
+    (timedelta(weeks=1), "Under a week"),
+    (timedelta(days=30), "Under a month"),
+    (timedelta(days=365), "Under a year"),
+    (timedelta.max, "A year or more")
+)
+
+
+def account_age_histogram(ages: List[timedelta]) -> Dict[str, int]:
+    """Returns how many accounts are in every account age bucket."""
+    histogram = dict.fromkeys((label for _, label in ACCOUNT_AGE_BUCKETS), 0)
+    for age in ages:
+        for upper_bound, label in ACCOUNT_AGE_BUCKETS:
+            if age < upper_bound:
+                histogram[label] += 1
+                break
+    return histogram
+
+
 class MemberLogCog(commands.Cog):
-    """Has listeners that logs member joins and member leaves."""
+    """
+    Has listeners that logs member joins and member leaves.
+
+    During join bursts (e.g. raids), joins aren't logged one by one. A
+    digest of the accounts that joined is logged every `digest_interval`
+    seconds instead, until the join rate drops.
+    """
+
+    def __init__(self, bot: Bot) -> None:
+        """Sets up the cog."""
+        self.bot = bot
+        self._joins = SlidingWindowCounter(MemberLog.join_window)
+        # Members that joined since the last digest, as (name, ID, account
+        # creation date)
+        self._digest_members: List[Tuple[str, int, datetime]] = []
+        # Running while joins are logged in digests
+        self._digest_task: Optional[asyncio.Task] = None
+        add_reload_listener(self._apply_config)
+
+    def _apply_config(self) -> None:
+        """Applies the join window of the reloaded config."""
+        self._joins.window = MemberLog.join_window
+
+    def cog_unload(self) -> None:
+        """Stops logging digests."""
+        remove_reload_listener(self._apply_config)
+        if self._digest_task is not None:
+            self._digest_task.cancel()
 
     @commands.Cog.listener()
     async def on_member_join(self, member: Member) -> None:
         """Listener for member joins."""
+        joins = self._joins.add()
+        if (
+            self._digest_task is None
+            and joins >= MemberLog.join_burst_threshold
+        ):
+            self._start_digest_mode(joins)
+        if self._digest_task is not None:
+            self._digest_members.append(
+                (str(member), member.id, member.created_at)
+            )
+            return
+
         member_information = Embed(
             title="Member joined",
             timestamp=datetime.now(),
@@ -29,8 +99,7 @@ class MemberLogCog(commands.Cog):
             inline=False
         )
         member_information.set_thumbnail(url=member.avatar_url)
-        member_log_channel = member.guild.get_channel(Channels.member_logs)
-        await member_log_channel.send(embed=member_information)
+        self.bot.log_dispatcher.send(Channels.member_logs, member_information)
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: Member) -> None:
@@ -50,10 +119,107 @@ class MemberLogCog(commands.Cog):
             inline=False
         )
         member_information.set_thumbnail(url=member.avatar_url)
-        member_log_channel = member.guild.get_channel(Channels.member_logs)
-        await member_log_channel.send(embed=member_information)
+        self.bot.log_dispatcher.send(Channels.member_logs, member_information)
+
+    def _start_digest_mode(self, joins: int) -> None:
+        """Starts logging joins in digests."""
+        logger.warning(f"Join burst detected, {joins} joins.")
+        embed = Embed(
+            title="Join burst detected",
+            description=(
+                f"{joins} members joined in the last "
+                f"{MemberLog.join_window:.0f} seconds. Joins will be logged "
+                f"in a digest every {MemberLog.digest_interval:.0f} seconds "
+                "until the join rate drops."
+            ),
+            timestamp=datetime.now(),
+            color=Colors.orange
+        )
+        self.bot.log_dispatcher.send(Channels.member_logs, embed)
+        self._digest_task = self.bot.loop.create_task(self._log_digests())
+
+    async def _log_digests(self) -> None:
+        """
+        Logs a digest of joins every `digest_interval` seconds.
+
+        Digest mode ends once less than half of `join_burst_threshold`
+        members joined within the window, so it doesn't flap around the
+        threshold.
+        """
+        try:
+            while True:
+                await asyncio.sleep(MemberLog.digest_interval)
+                self._log_digest()
+                if self._joins.count() < MemberLog.join_burst_threshold / 2:
+                    break
+        finally:
+            self._digest_task = None
+
+        embed = Embed(
+            title="Join burst ended",
+            description="Joins are logged one by one again.",
+            timestamp=datetime.now(),
+            color=Colors.green
+        )
+        self.bot.log_dispatcher.send(Channels.member_logs, embed)
+
+    def _log_digest(self) -> None:
+        """Logs the members that joined since the last digest."""
+        members, self._digest_members = self._digest_members, []
+        if not members:
+            return
+
+        now = datetime.utcnow()
+        histogram = account_age_histogram(
+            [now - created_at for _, _, created_at in members]
+        )
+        embed = Embed(
+            title="Join digest",
+            timestamp=datetime.now(),
+            color=Colors.orange
+        )
+        embed.add_field(
+            name="Information",
+            value=textwrap.dedent(f"""
+                Joins since the last digest: {len(members)}
+                Joins within the window: {self._joins.count()}
+            """),
+            inline=False
+        )
+        embed.add_field(
+            name="Account ages",
+            value="\n".join(
+                f"{label}: {count}" for label, count in histogram.items()
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Newest accounts",
+            value=textwrap.shorten(
+                ", ".join(
+                    f"{name} ({member_id})"
+                    for name, member_id, _ in sorted(
+                        members,
+                        key=lambda member: member[2],
+                        reverse=True
+                    )
+                ),
+                1024,
+                placeholder="..."
+            ),
+            inline=False
+        )
+        accounts = io.BytesIO("\n".join(
+            f"{member_id}\t{name}\t{created_at}"
+            for name, member_id, created_at in members
+        ).encode())
+        self.bot.log_dispatcher.send(
+            Channels.member_logs,
+            embed,
+            file=File(accounts, filename="joins.txt")
+        )
 
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
-    bot.add_cog(MemberLogCog())
+    bot.add_cog(MemberLogCog(bot))
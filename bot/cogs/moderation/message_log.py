@@ -1,37 +1,138 @@
-import asyncio
 import textwrap
+import time
 from datetime import datetime
+from typing import List, Literal, Optional
+
+from asyncpg import Record
 
 from bot.bot import Bot
-from bot.constants import Channels, Colors
+from bot.constants import Channels, Colors, Database, MessageLog
+from bot.utils.cache import TTLSet
+from bot.utils.checks import has_configured_role
+from bot.utils.message_cache import (
+    CachedMessage, MessageContentCache, record_of
+)
+from bot.utils.transcripts import (
+    build_transcript, cached_message_record, message_record
+)
 
 from discord import (
-    Embed, Message, RawMessageDeleteEvent, RawMessageUpdateEvent
+    Embed, File, Guild, Message, RawBulkMessageDeleteEvent,
+    RawMessageDeleteEvent, RawMessageUpdateEvent, User
 )
 from discord.ext import commands
 
 
+SEARCH_RESULTS = 10
+# Searches match the full-text index of message_logs.content
+SEARCH_QUERY = """
+    SELECT event, message_id, channel_id, author_id, logged_at, content,
+        new_content
+    FROM message_logs
+    WHERE to_tsvector('simple', content) @@ plainto_tsquery('simple', $1)
+    ORDER BY logged_at DESC
+    LIMIT $2
+"""
+SEARCH_BY_AUTHOR_QUERY = """
+    SELECT event, message_id, channel_id, author_id, logged_at, content,
+        new_content
+    FROM message_logs
+    WHERE to_tsvector('simple', content) @@ plainto_tsquery('simple', $1)
+        AND author_id = $3
+    ORDER BY logged_at DESC
+    LIMIT $2
+"""
+
+
 class MessageLogCog(commands.Cog):
     """Logs message deletions and message edits to assist with moderation."""
 
     def __init__(self, bot: Bot) -> None:
         """Sets up the cog."""
         self.bot = bot
-        # When a message is deleted, both on_message_delete and
-        # on_raw_message_delete are triggered, so, when on_message_delete is
-        # triggered, it will save the message ID here so the message deletion
-        # will be not logged twice
-        self._deleted_message_ids = []
-        # Same thing with on_message_edit and on_raw_message_edit
-        self._edited_message_ids = []
+        # When a cached message is deleted or edited, both the cached and the
+        # raw events are triggered. The raw events carry the cached message
+        # in that case and are skipped. The IDs of deleted messages logged by
+        # on_message_delete are also kept for a while, so a deletion is never
+        # logged twice. Edits aren't kept, a message can be edited many times.
+        self._deleted_message_ids = TTLSet(
+            MessageLog.dedupe_ttl,
+            MessageLog.dedupe_max_size
+        )
+        # Contents of messages that may not be in the internal cache anymore
+        # when they are deleted or edited
+        self.content_cache = MessageContentCache(
+            MessageLog.content_cache_max_bytes,
+            MessageLog.content_cache_spill_file,
+            MessageLog.content_cache_spill_max_rows
+        )
+        self.log_writer = bot.database.create_writer(
+            """
+            INSERT INTO message_logs (
+                event, message_id, channel_id, author_id, logged_at, content,
+                new_content
+            )
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            """,
+            batch_size=Database.write_batch_size,
+            flush_interval=Database.write_flush_interval,
+            max_retries=Database.write_max_retries,
+            max_buffered=Database.write_max_buffered
+        )
+
+    def cog_unload(self) -> None:
+        """Closes the spill file of the content cache and the writer."""
+        self.bot.loop.create_task(self.content_cache.close())
+        self.bot.loop.create_task(
+            self.bot.database.remove_writer(self.log_writer)
+        )
+
+    def _store(
+        self,
+        event: Literal["delete", "edit"],
+        message_id: int,
+        channel_id: int,
+        author_id: Optional[int],
+        content: str,
+        new_content: Optional[str] = None
+    ) -> None:
+        """Stores a deletion or an edit, to be searched later."""
+        self.log_writer.add((
+            event, message_id, channel_id, author_id, datetime.now(),
+            content, new_content
+        ))
+
+    def _is_logged_guild(self, guild: Guild) -> bool:
+        """Returns True if messages of a guild are logged."""
+        message_logs_channel = self.bot.get_channel(Channels.message_logs)
+        return (
+            guild is not None
+            and message_logs_channel is not None
+            and guild.id == message_logs_channel.guild.id
+        )
+
+    @commands.Cog.listener()
+    async def on_message(self, message: Message) -> None:
+        """Keeps the content of messages, in case they are deleted."""
+        if message.author.bot or not self._is_logged_guild(message.guild):
+            return
+
+        self.content_cache.add(record_of(message))
 
     @commands.Cog.listener()
     async def on_message_delete(self, message: Message) -> None:
         """Listener for message deletions."""
-        self._deleted_message_ids.append(message.id)
+        self._deleted_message_ids.add(message.id)
+        self.content_cache.discard(message.id)
         if message.embeds:
             return
-        message_logs_channel = message.guild.get_channel(Channels.message_logs)
+        self._store(
+            "delete",
+            message.id,
+            message.channel.id,
+            message.author.id,
+            message.content
+        )
         embed = Embed(
             title="Message deleted",
             timestamp=datetime.now(),
@@ -52,7 +153,7 @@ class MessageLogCog(commands.Cog):
             value=textwrap.shorten(message.content, 1024, placeholder="..."),
             inline=False
         )
-        await message_logs_channel.send(embed=embed)
+        self.bot.log_dispatcher.send(Channels.message_logs, embed)
 
     @commands.Cog.listener()
     async def on_raw_message_delete(
@@ -65,48 +166,147 @@ class MessageLogCog(commands.Cog):
         Unlike `on_message_delete`, this is a raw response, so the message
         content is unknown if it wasn't cached.
         """
-        # on_message_delete and on_raw_message_delete, wait 1 second and then
-        # check if the deleted message also triggered on_message_delete
-        await asyncio.sleep(1)
-        if message.message_id in self._deleted_message_ids:
+        # Cached messages are logged by on_message_delete
+        if (
+            message.cached_message is not None
+            or message.message_id in self._deleted_message_ids
+        ):
             return
 
         message_channel = self.bot.get_channel(message.channel_id)
-        message_logs_channel = self.bot.get_channel(Channels.message_logs)
+        cached = await self.content_cache.pop(message.message_id)
 
         embed = Embed(
             title="Message deleted",
             timestamp=datetime.now(),
             color=Colors.default
         )
+        if cached is not None:
+            self._store(
+                "delete",
+                message.message_id,
+                message.channel_id,
+                cached.author_id,
+                cached.content
+            )
+            embed.add_field(
+                name="Information",
+                value=textwrap.dedent(f"""
+                    Author: <@{cached.author_id}>
+                    Author ID: {cached.author_id}
+                    Channel: {message_channel} ({message_channel.mention})
+                    Channel ID: {message_channel.id}
+                    Message ID: {message.message_id}
+                """),
+                inline=False
+            )
+            embed.add_field(
+                name="Message",
+                value=textwrap.shorten(
+                    cached.content,
+                    1024,
+                    placeholder="..."
+                ),
+                inline=False
+            )
+        else:
+            embed.add_field(
+                name="Information",
+                value=textwrap.dedent(f"""
+                    Channel: {message_channel} ({message_channel.mention})
+                    Channel ID: {message_channel.id}
+                    Message ID: {message.message_id}
+                    The author is unknown, the message is not found in the
+                    internal cache.
+                """),
+                inline=False
+            )
+            embed.add_field(
+                name="Message",
+                value=(
+                    "The message is unknown, the message is not found in the "
+                    "internal cache."
+                ),
+                inline=False
+            )
+        self.bot.log_dispatcher.send(Channels.message_logs, embed)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self,
+        payload: RawBulkMessageDeleteEvent
+    ) -> None:
+        """
+        Listener for bulk message deletions, e.g. purges.
+
+        The deletion is logged as a single entry, with a transcript of the
+        cached messages attached.
+        """
+        message_channel = self.bot.get_channel(payload.channel_id)
+        messages = sorted(payload.cached_messages, key=lambda m: m.id)
+        records = [message_record(message) for message in messages]
+        # Messages that aren't in the internal cache may be in ours
+        cached_ids = {message.id for message in messages}
+        for message_id in cached_ids:
+            self.content_cache.discard(message_id)
+        records.extend(
+            cached_message_record(cached)
+            for cached in await self.content_cache.pop_many(
+                payload.message_ids - cached_ids
+            )
+        )
+        records.sort(key=lambda record: record["id"])
+        logged_at = datetime.now()
+        self.log_writer.add_many(
+            (
+                "delete", record["id"], record["channel_id"],
+                record["author_id"], logged_at, record["content"], None
+            )
+            for record in records
+        )
+        uncached = len(payload.message_ids) - len(records)
+
+        embed = Embed(
+            title="Messages bulk deleted",
+            timestamp=datetime.now(),
+            color=Colors.default
+        )
         embed.add_field(
             name="Information",
             value=textwrap.dedent(f"""
                 Channel: {message_channel} ({message_channel.mention})
-                Channel ID: {message_channel.id}
-                Message ID: {message.message_id}
-                The author is unknown, the message is not found in the internal
-                cache.
+                Channel ID: {payload.channel_id}
+                Deleted messages: {len(payload.message_ids)}
+                Messages in the transcript: {len(records)}
+                Messages not found in the caches: {uncached}
             """),
             inline=False
         )
-        embed.add_field(
-            name="Message",
-            value=(
-                "The message is unknown, the message is not found in the "
-                "internal cache."
-            ),
-            inline=False
+        transcript = build_transcript(records)
+        self.bot.log_dispatcher.send(
+            Channels.message_logs,
+            embed,
+            file=File(
+                transcript,
+                filename=f"bulk_delete_{payload.channel_id}.jsonl.gz"
+            )
         )
-        await message_logs_channel.send(embed=embed)
 
     @commands.Cog.listener()
     async def on_message_edit(self, before: Message, after: Message) -> None:
         """Listener for message edits."""
-        self._edited_message_ids.append(after.id)
+        if not after.author.bot and self._is_logged_guild(after.guild):
+            self.content_cache.add(record_of(after))
         if before.embeds or after.embeds:
             return
-        message_logs_channel = after.guild.get_channel(Channels.message_logs)
+        self._store(
+            "edit",
+            after.id,
+            after.channel.id,
+            after.author.id,
+            before.content,
+            after.content
+        )
         embed = Embed(
             title="Message edited",
             timestamp=datetime.now(),
@@ -132,7 +332,7 @@ class MessageLogCog(commands.Cog):
             value=textwrap.shorten(after.content, 1024, placeholder="..."),
             inline=False
         )
-        await message_logs_channel.send(embed=embed)
+        self.bot.log_dispatcher.send(Channels.message_logs, embed)
 
     @commands.Cog.listener()
     async def on_raw_message_edit(self, after: RawMessageUpdateEvent) -> None:
@@ -140,13 +340,10 @@ class MessageLogCog(commands.Cog):
         Listener for message edits.
 
         Unlike `on_message_edit`, this is a raw response, so the message
-        content is unknown if it wasn't cached.
+        content before the edit is only known if it's in the content cache.
         """
-        # on_message_edit and on_raw_message_edit are triggered at the same
-        # time when a message is edited, wait 1 second and then check if
-        # on_message_edit was called.
-        await asyncio.sleep(1)
-        if after.message_id in self._edited_message_ids:
+        # Cached messages are logged by on_message_edit
+        if after.cached_message is not None:
             return
         try:
             message_content = after.data["content"]
@@ -154,34 +351,167 @@ class MessageLogCog(commands.Cog):
             # It's an embed
             return
         message_channel = self.bot.get_channel(after.channel_id)
-        message_logs_channel = self.bot.get_channel(Channels.message_logs)
+        cached = await self.content_cache.get(after.message_id)
+        if cached is not None:
+            self.content_cache.add(CachedMessage(
+                cached.id,
+                cached.channel_id,
+                cached.author_id,
+                cached.created_at,
+                message_content
+            ))
 
         embed = Embed(
             title="Message edited",
             timestamp=datetime.now(),
             color=Colors.default
         )
-        embed.add_field(
-            name="Information",
-            value=textwrap.dedent(f"""
-                Channel: {message_channel} ({message_channel.mention})
-                Channel ID: {message_channel.id}
-                Message ID: {after.message_id}
-                The author is unknown, this message is not cached.
-            """),
-            inline=False
-        )
-        embed.add_field(
-            name="Message before",
-            value="The message before is unknown, the message is not cached.",
-            inline=False
-        )
+        if cached is not None:
+            self._store(
+                "edit",
+                after.message_id,
+                after.channel_id,
+                cached.author_id,
+                cached.content,
+                message_content
+            )
+            embed.add_field(
+                name="Information",
+                value=textwrap.dedent(f"""
+                    Author: <@{cached.author_id}>
+                    Author ID: {cached.author_id}
+                    Channel: {message_channel} ({message_channel.mention})
+                    Channel ID: {message_channel.id}
+                    Message ID: {after.message_id}
+                """),
+                inline=False
+            )
+            embed.add_field(
+                name="Message before",
+                value=textwrap.shorten(
+                    cached.content,
+                    1024,
+                    placeholder="..."
+                ),
+                inline=False
+            )
+        else:
+            embed.add_field(
+                name="Information",
+                value=textwrap.dedent(f"""
+                    Channel: {message_channel} ({message_channel.mention})
+                    Channel ID: {message_channel.id}
+                    Message ID: {after.message_id}
+                    The author is unknown, this message is not cached.
+                """),
+                inline=False
+            )
+            embed.add_field(
+                name="Message before",
+                value=(
+                    "The message before is unknown, the message is not "
+                    "cached."
+                ),
+                inline=False
+            )
         embed.add_field(
             name="Message now",
             value=textwrap.shorten(message_content, 1024, placeholder="..."),
             inline=False
         )
-        await message_logs_channel.send(embed=embed)
+        self.bot.log_dispatcher.send(Channels.message_logs, embed)
+
+    @commands.group(name="logs")
+    @has_configured_role("staff")
+    async def logs(self, ctx: commands.Context) -> None:
+        """A group of commands for the stored message logs."""
+        if ctx.invoked_subcommand is None:
+            await ctx.send_help(ctx.command)
+
+    @logs.command(name="search")
+    async def search(self, ctx: commands.Context, *, query: str) -> None:
+        """
+        Searches deleted and edited messages, newest first.
+
+        The content before the deletion or the edit is searched.
+        """
+        start = time.perf_counter()
+        results = await self.bot.database.fetch(
+            SEARCH_QUERY,
+            query,
+            SEARCH_RESULTS
+        )
+        elapsed = time.perf_counter() - start
+        await self._send_search_results(ctx, query, results, elapsed)
+
+    @logs.command(name="author")
+    async def search_author(
+        self,
+        ctx: commands.Context,
+        author: User,
+        *,
+        query: str
+    ) -> None:
+        """
+        Searches deleted and edited messages of an author, newest first.
+
+        The content before the deletion or the edit is searched.
+        """
+        start = time.perf_counter()
+        results = await self.bot.database.fetch(
+            SEARCH_BY_AUTHOR_QUERY,
+            query,
+            SEARCH_RESULTS,
+            author.id
+        )
+        elapsed = time.perf_counter() - start
+        await self._send_search_results(ctx, query, results, elapsed)
+
+    async def _send_search_results(
+        self,
+        ctx: commands.Context,
+        query: str,
+        results: List[Record],
+        elapsed: float
+    ) -> None:
+        """Sends the results of a search."""
+        if not results:
+            await ctx.send(":x: No logged messages found.")
+            return
+
+        embed = Embed(
+            title=textwrap.shorten(
+                f"Logged messages matching {query!r}",
+                256,
+                placeholder="..."
+            ),
+            color=Colors.default
+        )
+        for result in results:
+            value = textwrap.dedent(f"""
+                Author: <@{result['author_id']}>
+                Channel: <#{result['channel_id']}>
+                Message ID: {result['message_id']}
+                Logged at: {result['logged_at']}
+            """)
+            value += textwrap.shorten(
+                result["content"],
+                300,
+                placeholder="..."
+            )
+            if result["new_content"] is not None:
+                value += "\nNow: " + textwrap.shorten(
+                    result["new_content"],
+                    200,
+                    placeholder="..."
+                )
+            embed.add_field(
+                name=result["event"].capitalize(),
+                value=value,
+                inline=False
+            )
+        embed.set_footer(text=f"Searched in {elapsed * 1000:.0f} ms")
+        await ctx.send(embed=embed)
 
 
 def setup(bot: Bot) -> None:
@@ -2,110 +2,367 @@ import asyncio
 import logging
 import textwrap
 from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
 
 from bot.bot import Bot
-from bot.constants import Channels, Colors, Roles
+from bot.constants import Channels, Colors, Moderation, Roles
 from bot.converters import DurationConverter
+from bot.utils.checks import has_configured_role
+from bot.utils.scheduling import ExpiryQueue
 
-from discord import Embed
+from discord import CategoryChannel, Embed, Member, TextChannel
 from discord.ext import commands
 
 
 logging = logging.getLogger(__name__)
 
+DEFAULT_SILENCE_DURATION = timedelta(minutes=15)
+
+
+class Silence(NamedTuple):
+    """A silenced channel."""
+
+    moderator_id: int
+    until: datetime
+
 
 class SilenceCog(commands.Cog):
-    """Has commands that silences and unsilences channels."""
+    """
+    Has commands that silences and unsilences channels.
+
+    Silenced channels are kept by ID, and a single task unsilences them when
+    their silence expires. Silences are also saved into the database, so
+    they are restored when the bot restarts.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, bot: Bot) -> None:
         """Sets up the cog."""
-        # This list will contain objects of channels that are silenced
-        self._silenced_channels = []
+        self.bot = bot
+        # Maps IDs of silenced channels to their silence
+        self._silenced_channels: Dict[int, Silence] = {}
+        self.silences = ExpiryQueue(self._expire_silence)
+
+    async def cog_load(self) -> None:
+        """
+        Restores the silences saved into the database.
+
+        Silences that expired while the bot was down expire once the bot is
+        ready, because unsilencing them needs the channels. Silences are
+        expired even if they couldn't be restored, because channels can be
+        silenced while the database is down.
+        """
+        self.bot.loop.create_task(self._start_when_ready())
+        silences = await self.bot.database.fetch(
+            "SELECT channel_id, moderator_id, expires_at FROM silences"
+        )
+        for silence in silences:
+            # Naive local times, like the ones of the silence commands
+            until = silence["expires_at"].astimezone().replace(tzinfo=None)
+            # Channels silenced while restoring keep their newer silence
+            if silence["channel_id"] in self._silenced_channels:
+                continue
+            self._silenced_channels[silence["channel_id"]] = Silence(
+                silence["moderator_id"],
+                until
+            )
+            self.silences.schedule(silence["channel_id"], until)
+        logging.info(f"{len(silences)} silenced channels restored.")
+
+    async def _start_when_ready(self) -> None:
+        """Starts unsilencing channels once the channels are available."""
+        await self.bot.wait_until_ready()
+        self.silences.start()
+
+    def cog_unload(self) -> None:
+        """Stops unsilencing channels."""
+        self.silences.stop()
 
     @commands.command(name="silence", aliases=("lock",))
-    @commands.has_role(Roles.staff)
+    @has_configured_role("staff")
     async def silence(
         self,
         ctx: commands.Context,
-        until: DurationConverter = datetime.now() + timedelta(minutes=15)
+        until: DurationConverter = None
     ) -> None:
         """
         Locks the channel for the specified time.
 
         If no arguments are specified, it defaults to 15 minutes.
         """
-        if ctx.channel in self._silenced_channels:
+        if ctx.channel.id in self._silenced_channels:
             await ctx.send(":x: This channel is already silenced.")
             return
 
-        await self._silence(ctx, until)
+        until = until or datetime.now() + DEFAULT_SILENCE_DURATION
+        if await self._silence(ctx.channel, ctx.author, until):
+            self._report_silence(ctx.channel, ctx.author, until)
 
     @commands.command(name="unsilence", aliases=("unlock",))
-    @commands.has_role(Roles.staff)
+    @has_configured_role("staff")
     async def unsilence(
         self,
         ctx: commands.Context
     ) -> None:
         """Unlocks the channel, if it was locked already."""
-        if ctx.channel not in self._silenced_channels:
+        if ctx.channel.id not in self._silenced_channels:
             await ctx.send(":x: This channel is not silenced.")
             return
 
-        await self._unsilence(ctx)
+        await self._unsilence(ctx.channel.id)
+        self._report_unsilence(ctx.channel, ctx.author.id)
 
-    async def _silence(self, ctx: commands.Context, until: datetime) -> None:
-        """Base function for silencing a channel."""
-        self._silenced_channels.append(ctx.channel)
-        until_seconds = self._datetime_to_seconds(
-            until
-        ) - self._datetime_to_seconds(
-            datetime.now()
-        )
-        until_minutes = until_seconds / 60
-        await ctx.channel.set_permissions(
-            ctx.guild.get_role(Roles.human),
-            add_reactions=False,
-            send_messages=False,
-            read_messages=True,
-            read_message_history=True
+    @commands.command(name="lockdown")
+    @has_configured_role("staff")
+    async def lockdown(
+        self,
+        ctx: commands.Context,
+        channels: commands.Greedy[TextChannel],
+        category: Optional[CategoryChannel] = None,
+        until: DurationConverter = None
+    ) -> None:
+        """
+        Locks many channels, or every channel of a category, at once.
+
+        If no duration is specified, it defaults to 15 minutes.
+        """
+        targets = {channel.id: channel for channel in channels}
+        if category is not None:
+            targets.update(
+                (channel.id, channel) for channel in category.text_channels
+            )
+        targets = [
+            channel for channel_id, channel in targets.items()
+            if channel_id not in self._silenced_channels
+        ]
+        if not targets:
+            await ctx.send(":x: No channels to silence.")
+            return
+
+        until = until or datetime.now() + DEFAULT_SILENCE_DURATION
+        semaphore = asyncio.Semaphore(Moderation.lockdown_concurrency)
+
+        async def silence_channel(channel: TextChannel) -> bool:
+            """Silences a channel, waiting for its turn."""
+            async with semaphore:
+                return await self._silence(channel, ctx.author, until)
+
+        results = await asyncio.gather(
+            *(silence_channel(channel) for channel in targets),
+            return_exceptions=True
         )
+        silenced = []
+        failed = []
+        for channel, result in zip(targets, results):
+            if isinstance(result, Exception):
+                failed.append(channel)
+                logging.error(
+                    f"Could not silence {channel} ({channel.id}).",
+                    exc_info=result
+                )
+            elif result:
+                silenced.append(channel)
+
+        minutes = (until - datetime.now()).total_seconds() / 60
         await ctx.send(
-            ":white_check_mark: This channel is silenced for "
-            f"{until_minutes:.2f} minutes."
+            f":white_check_mark: {len(silenced)} channels are silenced for "
+            f"{minutes:.2f} minutes."
+            + (f" {len(failed)} channels failed." if failed else "")
         )
-        # Save action on the #management channel
-        management_channel = ctx.guild.get_channel(Channels.management)
+
         report = Embed(
-            title="Channel silenced",
+            title="Lockdown",
             timestamp=datetime.now(),
             color=Colors.red
         )
         report.add_field(
             name="Information",
             value=textwrap.dedent(f"""
-                Channel: {ctx.channel} ({ctx.channel.mention})
-                Channel ID: {ctx.channel.id}
                 Moderator: {ctx.author} ({ctx.author.mention})
                 Moderator ID: {ctx.author.id}
-                Until: {until_minutes:.2f} minutes
+                Until: {minutes:.2f} minutes
+                Silenced: {len(silenced)}
+                Failed: {len(failed)}
             """),
             inline=False
         )
-        await management_channel.send(embed=report)
-        await asyncio.sleep(until_seconds)
-        await self._unsilence(ctx)
+        report.add_field(
+            name="Silenced channels",
+            value=textwrap.shorten(
+                " ".join(channel.mention for channel in silenced) or "None",
+                1024,
+                placeholder="..."
+            ),
+            inline=False
+        )
+        if failed:
+            report.add_field(
+                name="Failed channels",
+                value=textwrap.shorten(
+                    " ".join(channel.mention for channel in failed),
+                    1024,
+                    placeholder="..."
+                ),
+                inline=False
+            )
+        self.bot.log_dispatcher.send(Channels.management, report)
+
+    async def _silence(
+        self,
+        channel: TextChannel,
+        moderator: Member,
+        until: datetime
+    ) -> bool:
+        """
+        Base function for silencing a channel.
+
+        Returns False if the channel was unsilenced while it was being
+        locked, in which case it's unlocked again.
+        """
+        # Marked as silenced before waiting for Discord, so it isn't
+        # silenced twice
+        silence = Silence(moderator.id, until)
+        self._silenced_channels[channel.id] = silence
+        try:
+            await channel.set_permissions(
+                channel.guild.get_role(Roles.human),
+                add_reactions=False,
+                send_messages=False,
+                read_messages=True,
+                read_message_history=True
+            )
+        except Exception:
+            # It may have been unsilenced, and even silenced again, meanwhile
+            if self._silenced_channels.get(channel.id) is silence:
+                self._silenced_channels.pop(channel.id)
+            raise
+
+        if self._silenced_channels.get(channel.id) is not silence:
+            # Unsilenced while it was being locked, the unlock may have
+            # reached Discord before the lock did. If it was silenced again
+            # since, that silence takes care of it.
+            if channel.id not in self._silenced_channels:
+                await channel.edit(sync_permissions=True)
+            return False
+
+        self.silences.schedule(channel.id, until)
+        # Saved after locking the channel, so channels can be silenced while
+        # the database is down. The silence is then only lost on a restart.
+        try:
+            await self.bot.database.execute(
+                """
+                INSERT INTO silences (
+                    channel_id, moderator_id, inserted_at, expires_at
+                )
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (channel_id) DO UPDATE
+                SET moderator_id = EXCLUDED.moderator_id,
+                    inserted_at = EXCLUDED.inserted_at,
+                    expires_at = EXCLUDED.expires_at
+                """,
+                channel.id,
+                moderator.id,
+                datetime.now(),
+                until
+            )
+        except Exception:
+            logging.warning(
+                f"Could not save the silence of {channel} ({channel.id}), "
+                "it won't be restored after a restart.",
+                exc_info=True
+            )
+
+        minutes = (until - datetime.now()).total_seconds() / 60
+        await channel.send(
+            ":white_check_mark: This channel is silenced for "
+            f"{minutes:.2f} minutes."
+        )
+        return True
+
+    async def _unsilence(self, channel_id: int) -> Optional[Silence]:
+        """
+        Base function for unsilencing a channel.
 
-    async def _unsilence(self, ctx: commands.Context) -> None:
-        """Base function for unsilencing a channel."""
-        if ctx.channel not in self._silenced_channels:
+        Returns the silence of the channel, or None if it wasn't silenced.
+        """
+        silence = self._silenced_channels.pop(channel_id, None)
+        if silence is None:
+            return None
+        self.silences.cancel(channel_id)
+
+        channel = self.bot.get_channel(channel_id)
+        # The channel may have been deleted
+        if channel is not None:
+            await channel.edit(sync_permissions=True)
+        # Deleted after unlocking the channel, so if unlocking fails, it's
+        # tried again after a restart
+        await self._delete_silence(channel_id)
+        if channel is not None:
+            await channel.send(
+                ":white_check_mark: This channel is now unsilenced."
+            )
+        return silence
+
+    async def _delete_silence(self, channel_id: int) -> None:
+        """
+        Deletes the silence of a channel from the database.
+
+        If the database is down, the silence is kept and expires again after
+        a restart, which only unlocks the channel again.
+        """
+        try:
+            await self.bot.database.execute(
+                "DELETE FROM silences WHERE channel_id = $1",
+                channel_id
+            )
+        except Exception:
+            logging.warning(
+                f"Could not delete the silence of channel {channel_id}.",
+                exc_info=True
+            )
+
+    async def _expire_silence(self, channel_id: int, _: None) -> None:
+        """Unsilences a channel whose silence expired."""
+        silence = await self._unsilence(channel_id)
+        channel = self.bot.get_channel(channel_id)
+        if silence is None or channel is None:
             return
 
-        del self._silenced_channels[self._silenced_channels.index(ctx.channel)]
+        # The moderator that silenced the channel
+        self._report_unsilence(channel, silence.moderator_id)
+
+    def _report_silence(
+        self,
+        channel: TextChannel,
+        moderator: Member,
+        until: datetime
+    ) -> None:
+        """Saves a silence on the #management channel."""
+        minutes = (until - datetime.now()).total_seconds() / 60
+        report = Embed(
+            title="Channel silenced",
+            timestamp=datetime.now(),
+            color=Colors.red
+        )
+        report.add_field(
+            name="Information",
+            value=textwrap.dedent(f"""
+                Channel: {channel} ({channel.mention})
+                Channel ID: {channel.id}
+                Moderator: {moderator} ({moderator.mention})
+                Moderator ID: {moderator.id}
+                Until: {minutes:.2f} minutes
+            """),
+            inline=False
+        )
+        self.bot.log_dispatcher.send(Channels.management, report)
 
-        await ctx.channel.edit(sync_permissions=True)
-        await ctx.send(":white_check_mark: This channel is now unsilenced.")
-        # Save action on the #management channel
-        management_channel = ctx.guild.get_channel(Channels.management)
+    def _report_unsilence(
+        self,
+        channel: TextChannel,
+        moderator_id: int
+    ) -> None:
+        """Saves an unsilence on the #management channel."""
+        moderator = self.bot.get_user(moderator_id)
         report = Embed(
             title="Channel unsilenced",
             timestamp=datetime.now(),
@@ -114,20 +371,16 @@ class SilenceCog(commands.Cog):
         report.add_field(
             name="Information",
             value=textwrap.dedent(f"""
-                Channel: {ctx.channel} ({ctx.channel.mention})
-                Channel ID: {ctx.channel.id}
-                Moderator: {ctx.author} ({ctx.author.mention})
-                Moderator ID: {ctx.author.id}
+                Channel: {channel} ({channel.mention})
+                Channel ID: {channel.id}
+                Moderator: {moderator} (<@{moderator_id}>)
+                Moderator ID: {moderator_id}
             """),
             inline=False
         )
-        await management_channel.send(embed=report)
-
-    def _datetime_to_seconds(self, datetime_obj: datetime) -> int:
-        """Converts a datetime object to seconds."""
-        return int(datetime_obj.timestamp())
+        self.bot.log_dispatcher.send(Channels.management, report)
 
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
-    bot.add_cog(SilenceCog())
+    bot.add_cog(SilenceCog(bot))
@@ -1,9 +1,12 @@
 import logging
+import textwrap
 import traceback
 from typing import Optional
 
+from bot import constants
 from bot.bot import Bot
-from bot.constants import Bot as Bot_constants, Colors, Roles
+from bot.constants import Bot as Bot_constants, Colors
+from bot.utils.checks import has_configured_role
 
 from discord import Embed, TextChannel
 from discord.ext import commands
@@ -58,7 +61,7 @@ class OwnerCog(commands.Cog):
             await ctx.send(embed=res)
 
     @owner.command(name="say")
-    @commands.has_role(Roles.admins)
+    @has_configured_role("admins")
     async def say(
         self,
         ctx: commands.Context,
@@ -70,6 +73,74 @@ class OwnerCog(commands.Cog):
         channel_ = channel if channel else ctx.channel
         await channel_.send(message)
 
+    @owner.command(name="database", aliases=("db",))
+    async def database(self, ctx: commands.Context) -> None:
+        """Shows stats about the database connection pool."""
+        if ctx.author.id not in Bot_constants.owners:
+            return
+
+        stats = self.bot.database.stats()
+        embed = Embed(
+            title="Database pool",
+            color=Colors.default
+        )
+        embed.add_field(
+            name="Connections",
+            value=textwrap.dedent(f"""
+                Size: {stats['size']}/{stats['max_size']}
+                Idle: {stats['idle']}
+                In use: {stats['in_use']}
+                Waiting: {stats['waiting']}
+            """),
+            inline=False
+        )
+        embed.add_field(
+            name="Acquisitions",
+            value=textwrap.dedent(f"""
+                Total: {stats['acquisitions']}
+                While saturated: {stats['saturated_acquisitions']}
+                Average wait: {stats['average_wait_ms']:.2f} ms
+                Max wait: {stats['max_wait_ms']:.2f} ms
+                Average hold: {stats['average_hold_ms']:.2f} ms
+                Max hold: {stats['max_hold_ms']:.2f} ms
+            """),
+            inline=False
+        )
+        await ctx.send(embed=embed)
+
+    @owner.command(name="logs")
+    async def logs(self, ctx: commands.Context) -> None:
+        """Shows stats about the queue of log channel messages."""
+        if ctx.author.id not in Bot_constants.owners:
+            return
+
+        stats = self.bot.log_dispatcher.stats()
+        embed = Embed(
+            title="Log dispatcher",
+            color=Colors.default
+        )
+        embed.add_field(
+            name="Queue",
+            value=textwrap.dedent(f"""
+                Queued entries: {stats['queued']}
+                Most queued in a channel: {stats['max_queued']}
+                Dropped entries: {stats['dropped_entries']}
+                Failed entries: {stats['failed_entries']}
+            """),
+            inline=False
+        )
+        embed.add_field(
+            name="Sent",
+            value=textwrap.dedent(f"""
+                Messages: {stats['sent_messages']}
+                Entries: {stats['sent_entries']}
+                Average latency: {stats['average_latency_ms']:.0f} ms
+                Max latency: {stats['max_latency_ms']:.0f} ms
+            """),
+            inline=False
+        )
+        await ctx.send(embed=embed)
+
     @owner.group()
     async def reload(self, ctx: commands.Context) -> None:
         """A group of owner-only reload commands."""
@@ -92,6 +163,29 @@ class OwnerCog(commands.Cog):
             f':white_check_mark: Extension "{ext}" reloaded successfully.'
         )
 
+    @reload.command(name="config")
+    async def config(self, ctx: commands.Context) -> None:
+        """Reloads the config file, without restarting the bot."""
+        if ctx.author.id not in Bot_constants.owners:
+            return
+
+        try:
+            restart_required = constants.reload_config()
+        except constants.ConfigError as error:
+            await ctx.send(
+                f":x: Could not reload the config, the current config is "
+                f"kept: {error}"
+            )
+            return
+
+        if restart_required:
+            await ctx.send(
+                ":warning: Config reloaded, but these changes only apply "
+                f"after a restart: {', '.join(restart_required)}."
+            )
+            return
+        await ctx.send(":white_check_mark: Config reloaded successfully.")
+
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
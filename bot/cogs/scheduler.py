@@ -1,14 +1,149 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Literal
+
 from bot.bot import Bot
+from bot.constants import Channels, Database, Roles
+from bot.utils.scheduling import ExpiryQueue
 
+from discord import HTTPException, NotFound, Object
 from discord.ext import commands
 
 
+logger = logging.getLogger(__name__)
+
+# Pardons that failed are tried again after this delay, doubled every time
+# they fail, up to the maximum
+PARDON_RETRY_DELAY = timedelta(minutes=1)
+PARDON_MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+class PardonError(Exception):
+    """Raised when an infraction can't be pardoned yet."""
+
+
 class Scheduler(commands.Cog):
     """Schedules expiration dates for things."""
 
-    pass
+    def __init__(self, bot: Bot) -> None:
+        """Sets up the cog."""
+        self.bot = bot
+        self.infractions = ExpiryQueue(self._expire_infraction)
+        self.expired_writer = bot.database.create_writer(
+            "UPDATE infractions SET expired = TRUE WHERE id = $1",
+            batch_size=Database.write_batch_size,
+            flush_interval=Database.write_flush_interval,
+            max_retries=Database.write_max_retries,
+            max_buffered=Database.write_max_buffered
+        )
+
+    def cog_unload(self) -> None:
+        """Stops expiring infractions when the cog is unloaded."""
+        self.infractions.stop()
+        self.bot.loop.create_task(
+            self.bot.database.remove_writer(self.expired_writer)
+        )
+
+    async def cog_load(self) -> None:
+        """
+        Loads the infractions that haven't expired yet from the database.
+
+        Infractions that expired while the bot was down expire once the bot
+        is ready, because pardoning them needs the guild. Infractions are
+        expired even if they couldn't be loaded, so the ones applied after
+        that are still pardoned.
+        """
+        self.bot.loop.create_task(self._start_when_ready())
+        infractions = await self.bot.database.fetch(
+            """
+            SELECT id, bad_actor_id, action, expires_at
+            FROM infractions
+            WHERE expires_at IS NOT NULL AND NOT expired
+            ORDER BY expires_at
+            """
+        )
+        for infraction in infractions:
+            self.schedule_infraction(
+                infraction["id"],
+                infraction["bad_actor_id"],
+                infraction["action"],
+                infraction["expires_at"]
+            )
+        logger.info(f"{len(infractions)} infractions scheduled to expire.")
+
+    async def _start_when_ready(self) -> None:
+        """Starts expiring infractions once the guild is available."""
+        await self.bot.wait_until_ready()
+        self.infractions.start()
+
+    def schedule_infraction(
+        self,
+        infraction_id: int,
+        bad_actor_id: int,
+        action: Literal["mute", "tempban"],
+        expires_at: datetime,
+        failed_attempts: int = 0
+    ) -> None:
+        """Schedules an infraction to be pardoned when it expires."""
+        self.infractions.schedule(
+            infraction_id,
+            expires_at,
+            (bad_actor_id, action, failed_attempts)
+        )
+
+    async def _expire_infraction(
+        self,
+        infraction_id: int,
+        infraction: tuple
+    ) -> None:
+        """Pardons an expired infraction."""
+        bad_actor_id, action, failed_attempts = infraction
+        channel = self.bot.get_channel(Channels.infractions)
+
+        try:
+            if channel is None:
+                raise PardonError("the infractions channel isn't available")
+            guild = channel.guild
+            if action == "tempban":
+                await guild.unban(
+                    Object(bad_actor_id),
+                    reason=f"Infraction #{infraction_id} expired."
+                )
+            elif action == "mute":
+                bad_actor = guild.get_member(bad_actor_id)
+                if bad_actor is not None:
+                    await bad_actor.remove_roles(
+                        Object(Roles.muted),
+                        reason=f"Infraction #{infraction_id} expired."
+                    )
+        except NotFound:
+            # The ban or the member doesn't exist anymore
+            pass
+        except (HTTPException, PardonError):
+            delay = min(
+                PARDON_RETRY_DELAY * 2 ** failed_attempts,
+                PARDON_MAX_RETRY_DELAY
+            )
+            logger.exception(
+                f"Could not pardon infraction #{infraction_id}, trying again "
+                f"in {delay}."
+            )
+            self.schedule_infraction(
+                infraction_id,
+                bad_actor_id,
+                action,
+                datetime.now() + delay,
+                failed_attempts + 1
+            )
+            return
+
+        self.expired_writer.add((infraction_id,))
+        logger.info(
+            f"Infraction #{infraction_id} ({action}) of {bad_actor_id} "
+            "expired."
+        )
 
 
 def setup(bot: Bot) -> None:
     """Loads the cog into the bot."""
-    bot.add_cog(Scheduler())
+    bot.add_cog(Scheduler(bot))
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import os
+from typing import Dict
 
 from bot.bot import Bot
 from bot.constants import Colors
@@ -18,14 +20,23 @@ class TagsCog(commands.Cog):
         """Sets up the cog."""
         self.all_tags = {}
 
+    async def cog_load(self) -> None:
+        """Reads the tags from their files, without blocking the loop."""
+        loop = asyncio.get_event_loop()
+        self.all_tags = await loop.run_in_executor(None, self._read_tags)
+        logger.info(f"{len(self.all_tags)} tags loaded")
+
+    @staticmethod
+    def _read_tags() -> Dict[str, str]:
+        """Returns the content of every tag file, by tag name."""
+        tags = {}
         for tag in os.listdir("bot/resources/tags/"):
             if not tag.endswith(".md"):
                 continue
 
             with open(f"bot/resources/tags/{tag}", "r") as tag_file:
-                self.all_tags[tag.rstrip(".md")] = tag_file.read()
-
-            logger.info(f"Tag {tag.rstrip('.md')} loaded")
+                tags[tag[:-len(".md")]] = tag_file.read()
+        return tags
 
     @commands.command(name="tag")
     async def tag(self, ctx: commands.Context, tag_name: str) -> None:
@@ -1,7 +1,11 @@
 import logging
 from os import environ
 from pathlib import Path
-from typing import Optional, Union
+from types import MappingProxyType
+from typing import (
+    Any, Callable, Dict, List, Optional, Tuple, Union, get_args, get_origin,
+    get_type_hints
+)
 
 import yaml
 
@@ -18,48 +22,263 @@ def _env_constructor(loader: str, node: str) -> Optional[str]:
 yaml.SafeLoader.add_constructor("!ENV", _env_constructor)
 
 
-if not Path("config.yml").exists():
-    logger.critical('"config.yml" not found.')
-    raise SystemExit
-
-with open("config.yml") as f:
-    _CONFIG_FILE = yaml.safe_load(f)
-
+class ConfigError(Exception):
+    """Raised when the config file is missing or invalid."""
 
-class YAMLGetter(type):
-    """A metaclass with a magic method for extracting data from the YAML."""
 
-    subsection = None
+def _read_config() -> dict:
+    """Reads and parses the config file."""
+    if not Path("config.yml").exists():
+        raise ConfigError('"config.yml" not found.')
 
-    def __getattr__(cls, name: str) -> Union[str, int, float, list, dict]:
-        """
-        Returns something from the YAML config file.
-        """
+    with open("config.yml") as f:
         try:
-            if cls.subsection is not None:
-                return _CONFIG_FILE[cls.section][cls.subsection][name]
-            else:
-                return _CONFIG_FILE[cls.section][name]
-        except KeyError:
-            logger.error(
-                f'Name "{name}" or subsection "{cls.subsection}" or section '
-                f'"{cls.section}" not found.'
+            return yaml.safe_load(f)
+        except yaml.YAMLError as error:
+            raise ConfigError(f'"config.yml" is not valid YAML: {error}')
+
+
+def _is_valid(value: Any, expected: Any) -> bool:
+    """Returns True if a value from the YAML has the expected type."""
+    origin = get_origin(expected)
+    if origin is Union:
+        return any(_is_valid(value, option) for option in get_args(expected))
+    if origin is tuple:
+        item_type, _ = get_args(expected)
+        return isinstance(value, list) and all(
+            _is_valid(item, item_type) for item in value
+        )
+    if origin is dict:
+        key_type, value_type = get_args(expected)
+        return isinstance(value, dict) and all(
+            _is_valid(key, key_type) and _is_valid(item, value_type)
+            for key, item in value.items()
+        )
+    if expected is type(None):
+        return value is None
+    if isinstance(value, bool) and expected is not bool:
+        return False
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def _freeze(value: Any, expected: Any) -> Any:
+    """Converts a valid value from the YAML into an immutable one."""
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, dict):
+        return MappingProxyType(value)
+    if expected is float:
+        return float(value)
+    return value
+
+
+class _SectionMeta(type):
+    """A metaclass that gives sections a slot for every annotated field."""
+
+    def __new__(
+        cls,
+        name: str,
+        bases: tuple,
+        namespace: dict
+    ) -> "_SectionMeta":
+        """Creates the class, with its fields as `__slots__`."""
+        namespace["__slots__"] = tuple(namespace.get("__annotations__", ()))
+        return super().__new__(cls, name, bases, namespace)
+
+
+class ConfigSection(metaclass=_SectionMeta):
+    """
+    A read-only section of the config file.
+
+    Every annotated field is validated when the config is loaded, so a
+    missing or mistyped value stops the bot at startup instead of turning
+    into a None later.
+    """
+
+    section = None
+    subsection = None
+    # Fields that are only read at startup, so they only change after a
+    # restart
+    restart_required = ()
+
+    def __init__(self, config: dict) -> None:
+        """Loads the section from the parsed config file."""
+        self._replace(_compile_section(type(self), config))
+
+    def _replace(self, values: dict) -> None:
+        """Replaces the values of every field."""
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Prevents the config from being changed, except by reloading."""
+        raise AttributeError(f"{type(self).__name__}.{name} is read-only.")
+
+    def __repr__(self) -> str:
+        """Returns the path of the section."""
+        return f"<{type(self).__name__} {_section_path(type(self))}>"
+
+
+def _section_path(section_class: type) -> str:
+    """Returns the dotted path of a section in the config file."""
+    if section_class.subsection is None:
+        return section_class.section
+    return f"{section_class.section}.{section_class.subsection}"
+
+
+def _compile_section(section_class: type, config: dict) -> dict:
+    """Returns the validated values of a section of the parsed config."""
+    path = _section_path(section_class)
+    try:
+        data = config[section_class.section]
+        if section_class.subsection is not None:
+            data = data[section_class.subsection]
+    except (KeyError, TypeError):
+        raise ConfigError(f'Section "{path}" not found.')
+    # e.g. an empty section, which YAML parses as None
+    if not isinstance(data, dict):
+        raise ConfigError(
+            f'Section "{path}" must be a mapping, not {data!r}.'
+        )
+
+    values = {}
+    for name, expected in get_type_hints(section_class).items():
+        if name not in data:
+            raise ConfigError(f'"{name}" not found in section "{path}".')
+        value = data[name]
+        if not _is_valid(value, expected):
+            raise ConfigError(
+                f'"{path}.{name}" has an invalid value ({value!r}), it must '
+                f"be {getattr(expected, '__name__', expected)}."
             )
+        values[name] = _freeze(value, expected)
+    return values
 
 
-# Note: these variables are just hints
-class Bot(metaclass=YAMLGetter):
-    """Metaclass for accessing bot data."""
+class BotConfig(ConfigSection):
+    """The section with bot data."""
 
     section = "bot"
+    restart_required = (
+        "prefix", "database_url", "token", "member_roles_cache_size",
+        "extensions"
+    )
 
     prefix: str
-    token: str
-    owners: list
+    database_url: Optional[str]
+    token: Optional[str]
+    owners: Tuple[int, ...]
+    snekbox_url: Optional[str]
+    offensive_words_regex: Optional[str]
+    offensive_words_file: str
+    member_roles_cache_size: int
+    # Maps extension names to whether they are loaded
+    extensions: Dict[str, bool]
+
+
+class DatabaseConfig(ConfigSection):
+    """The section with database pool settings."""
+
+    section = "database"
+    restart_required = (
+        "pool_min_size", "pool_max_size", "statement_cache_size",
+        "write_batch_size", "write_flush_interval", "write_max_retries",
+        "write_max_buffered", "history_cache_size"
+    )
+
+    pool_min_size: int
+    pool_max_size: int
+    statement_cache_size: int
+    write_batch_size: int
+    write_flush_interval: float
+    write_max_retries: int
+    write_max_buffered: int
+    history_cache_size: int
+
+
+class ModerationConfig(ConfigSection):
+    """The section with moderation settings."""
+
+    section = "moderation"
+
+    mass_action_concurrency: int
+    mass_action_timeout: float
+    mass_action_max_users: int
+    lockdown_concurrency: int
+
+
+class FilterConfig(ConfigSection):
+    """The section with offensive content filter settings."""
+
+    section = "filter"
+    restart_required = ("verdict_cache_size", "offload_workers")
+
+    verdict_cache_size: int
+    offload_threshold: int
+    offload_workers: int
+    scan_timeout: float
+
+
+class AntiMalwareConfig(ConfigSection):
+    """The section with anti-malware settings."""
+
+    section = "anti_malware"
+    restart_required = (
+        "sniff_cache_size", "blocklist_capacity", "blocklist_error_rate"
+    )
+
+    sniff_cache_size: int
+    blocklist_capacity: int
+    blocklist_error_rate: float
 
 
-class Colors(metaclass=YAMLGetter):
-    """Metaclass for accessing color values."""
+class InformationConfig(ConfigSection):
+    """The section with information command settings."""
+
+    section = "information"
+
+    counters_reconcile_interval: float
+
+
+class LogDispatcherConfig(ConfigSection):
+    """The section with settings of the log channel dispatcher."""
+
+    section = "log_dispatcher"
+
+    flush_interval: float
+    max_queue_size: int
+
+
+class MemberLogConfig(ConfigSection):
+    """The section with member log settings."""
+
+    section = "member_log"
+
+    join_window: float
+    join_burst_threshold: int
+    digest_interval: float
+
+
+class MessageLogConfig(ConfigSection):
+    """The section with message log settings."""
+
+    section = "message_log"
+    restart_required = (
+        "dedupe_ttl", "dedupe_max_size", "content_cache_max_bytes",
+        "content_cache_spill_file", "content_cache_spill_max_rows"
+    )
+
+    dedupe_ttl: float
+    dedupe_max_size: int
+    content_cache_max_bytes: int
+    content_cache_spill_file: Optional[str]
+    content_cache_spill_max_rows: int
+
+
+class ColorsConfig(ConfigSection):
+    """The section with color values."""
 
     section = "style"
     subsection = "colors"
@@ -70,8 +289,8 @@ class Colors(metaclass=YAMLGetter):
     default: int
 
 
-class Emojis(metaclass=YAMLGetter):
-    """Metaclass for accessing emote string values."""
+class EmojisConfig(ConfigSection):
+    """The section with emote string values."""
 
     section = "style"
     subsection = "emojis"
@@ -82,8 +301,8 @@ class Emojis(metaclass=YAMLGetter):
     status_offline: str
 
 
-class Roles(metaclass=YAMLGetter):
-    """Metaclass for accessing role IDs."""
+class RolesConfig(ConfigSection):
+    """The section with role IDs."""
 
     section = "server"
     subsection = "roles"
@@ -101,17 +320,107 @@ class Roles(metaclass=YAMLGetter):
     announcements: int
 
 
-class WhitelistedFileExtensions(metaclass=YAMLGetter):
-    """Metaclass for accessing whitelisted file extensions."""
+class WhitelistedFileExtensionsConfig(ConfigSection):
+    """The section with whitelisted file extensions."""
 
     section = "server"
     subsection = "whitelisted_file_extensions"
 
-    whitelist: list
+    whitelist: Tuple[str, ...]
 
 
-class Channels(metaclass=YAMLGetter):
-    """Meteclass for accessing channel IDs."""
+class ChannelsConfig(ConfigSection):
+    """The section with channel IDs."""
 
     section = "server"
     subsection = "channels"
+
+    small_announcements: int
+    announcements: int
+    user_bots: int
+    infractions: int
+    message_logs: int
+    member_logs: int
+    errors: int
+    management: int
+
+
+try:
+    _config = _read_config()
+    Bot = BotConfig(_config)
+    Database = DatabaseConfig(_config)
+    Moderation = ModerationConfig(_config)
+    Filter = FilterConfig(_config)
+    AntiMalware = AntiMalwareConfig(_config)
+    Information = InformationConfig(_config)
+    LogDispatcher = LogDispatcherConfig(_config)
+    MemberLog = MemberLogConfig(_config)
+    MessageLog = MessageLogConfig(_config)
+    Colors = ColorsConfig(_config)
+    Emojis = EmojisConfig(_config)
+    Roles = RolesConfig(_config)
+    WhitelistedFileExtensions = WhitelistedFileExtensionsConfig(_config)
+    Channels = ChannelsConfig(_config)
+except ConfigError as error:
+    logger.critical(str(error))
+    raise SystemExit
+
+_SECTIONS: Tuple[ConfigSection, ...] = (
+    Bot, Database, Moderation, Filter, AntiMalware, Information,
+    LogDispatcher, MemberLog, MessageLog, Colors, Emojis, Roles,
+    WhitelistedFileExtensions, Channels
+)
+_reload_listeners: List[Callable[[], None]] = []
+
+
+def add_reload_listener(listener: Callable[[], None]) -> None:
+    """
+    Registers a function that is called after the config is reloaded.
+
+    Objects built from config values at startup (e.g. caches and counters)
+    use it to apply the new values.
+    """
+    _reload_listeners.append(listener)
+
+
+def remove_reload_listener(listener: Callable[[], None]) -> None:
+    """Unregisters a function added with `add_reload_listener`."""
+    if listener in _reload_listeners:
+        _reload_listeners.remove(listener)
+
+
+def reload_config() -> List[str]:
+    """
+    Reloads the config file.
+
+    Every section is validated before any is changed, so if the new config
+    is invalid, `ConfigError` is raised and the current config is kept. The
+    sections are then changed all at once, without giving control back to
+    the event loop, so no code ever sees a mix of the old and the new config.
+
+    Returns the paths of the changed fields that only change after a
+    restart.
+    """
+    config = _read_config()
+    compiled = [
+        (section, _compile_section(type(section), config))
+        for section in _SECTIONS
+    ]
+    restart_required = []
+    for section, values in compiled:
+        path = _section_path(type(section))
+        restart_required.extend(
+            f"{path}.{name}" for name in section.restart_required
+            if getattr(section, name) != values[name]
+        )
+        section._replace(values)
+
+    for listener in _reload_listeners:
+        listener()
+    logger.info("Config reloaded.")
+    if restart_required:
+        logger.warning(
+            "These changes only apply after a restart: "
+            f"{', '.join(restart_required)}."
+        )
+    return restart_required
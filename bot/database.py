@@ -0,0 +1,363 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+)
+
+import asyncpg
+
+
+logger = logging.getLogger(__name__)
+
+# Errors after which retrying a write may succeed
+RETRYABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError
+)
+
+
+class Database:
+    """
+    Owns the connection pool used by the whole bot.
+
+    The pool is created once when the bot starts and closed when the bot
+    shuts down. Every acquisition goes through `acquire`, which keeps track
+    of how long callers wait for a connection and how long they hold it, so
+    it's possible to tell when the database is the bottleneck.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        *,
+        min_size: int,
+        max_size: int,
+        statement_cache_size: int
+    ) -> None:
+        """Sets up the database, without connecting yet."""
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.pool: Optional[asyncpg.pool.Pool] = None
+        self._writers: List[BatchWriter] = []
+
+        self._in_use = 0
+        self._waiting = 0
+        self._acquisitions = 0
+        self._saturated_acquisitions = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._total_hold_time = 0.0
+        self._max_hold_time = 0.0
+
+    async def connect(self) -> None:
+        """
+        Creates the connection pool.
+
+        Calling this more than once does nothing, so reconnections to the
+        gateway never leak connections.
+        """
+        if self.pool is not None:
+            return
+
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=self.statement_cache_size
+        )
+        logger.info(
+            f"Database pool created (min size: {self.min_size}, max size: "
+            f"{self.max_size})."
+        )
+        for writer in self._writers:
+            writer.start()
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool, waiting for connections in use.
+
+        Batch writers are flushed before the pool is closed, so no buffered
+        rows are lost when the bot is stopped cleanly.
+        """
+        if self.pool is None:
+            return
+
+        try:
+            for writer in self._writers:
+                # A failing writer doesn't stop the others from being flushed
+                try:
+                    await writer.close()
+                except Exception:
+                    logger.exception(
+                        f"Could not close the writer of {writer.query!r}."
+                    )
+        finally:
+            pool, self.pool = self.pool, None
+            await pool.close()
+            logger.info("Database pool closed.")
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquires a connection from the pool, recording timing stats."""
+        if self.pool is None:
+            raise RuntimeError("The database pool is not connected.")
+
+        if self._in_use >= self.max_size:
+            self._saturated_acquisitions += 1
+
+        self._waiting += 1
+        wait_start = time.perf_counter()
+        try:
+            connection = await self.pool.acquire()
+        finally:
+            self._waiting -= 1
+
+        acquired_at = time.perf_counter()
+        wait_time = acquired_at - wait_start
+        self._acquisitions += 1
+        self._total_wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        self._in_use += 1
+
+        try:
+            yield connection
+        finally:
+            self._in_use -= 1
+            hold_time = time.perf_counter() - acquired_at
+            self._total_hold_time += hold_time
+            self._max_hold_time = max(self._max_hold_time, hold_time)
+            await self.pool.release(connection)
+
+    async def execute(self, query: str, *args: Any) -> str:
+        """Executes a query using a connection from the pool."""
+        async with self.acquire() as connection:
+            return await connection.execute(query, *args)
+
+    async def executemany(self, query: str, args: Iterable[tuple]) -> None:
+        """Executes a query once per set of arguments, in one round trip."""
+        async with self.acquire() as connection:
+            await connection.executemany(query, args)
+
+    async def fetch(self, query: str, *args: Any) -> List[asyncpg.Record]:
+        """Fetches all the rows returned by a query."""
+        async with self.acquire() as connection:
+            return await connection.fetch(query, *args)
+
+    async def fetchrow(
+        self,
+        query: str,
+        *args: Any
+    ) -> Optional[asyncpg.Record]:
+        """Fetches the first row returned by a query."""
+        async with self.acquire() as connection:
+            return await connection.fetchrow(query, *args)
+
+    async def fetchval(self, query: str, *args: Any) -> Any:
+        """Fetches the first value of the first row returned by a query."""
+        async with self.acquire() as connection:
+            return await connection.fetchval(query, *args)
+
+    def create_writer(
+        self,
+        query: str,
+        *,
+        batch_size: int,
+        flush_interval: float,
+        max_retries: int,
+        max_buffered: int,
+        on_flush: Optional[Callable[[List[tuple]], Awaitable[None]]] = None
+    ) -> "BatchWriter":
+        """Creates a batch writer that is flushed when the pool closes."""
+        writer = BatchWriter(
+            self,
+            query,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            max_retries=max_retries,
+            max_buffered=max_buffered,
+            on_flush=on_flush
+        )
+        self._writers.append(writer)
+        if self.pool is not None:
+            writer.start()
+        return writer
+
+    async def remove_writer(self, writer: "BatchWriter") -> None:
+        """Flushes and forgets a batch writer created by `create_writer`."""
+        if writer in self._writers:
+            self._writers.remove(writer)
+        await writer.close()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns acquisition timing and saturation stats of the pool."""
+        acquisitions = self._acquisitions or 1
+        return {
+            "size": self.pool.get_size() if self.pool else 0,
+            "idle": self.pool.get_idle_size() if self.pool else 0,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "max_size": self.max_size,
+            "acquisitions": self._acquisitions,
+            "saturated_acquisitions": self._saturated_acquisitions,
+            "average_wait_ms": self._total_wait_time / acquisitions * 1000,
+            "max_wait_ms": self._max_wait_time * 1000,
+            "average_hold_ms": self._total_hold_time / acquisitions * 1000,
+            "max_hold_ms": self._max_hold_time * 1000
+        }
+
+
+class BatchWriter:
+    """
+    Write-behind buffer for rows of a single query.
+
+    Rows are added without waiting for the database, and are written with
+    `executemany` when `batch_size` rows are buffered or every
+    `flush_interval` seconds, whichever comes first. Rows are only removed
+    from the buffer once they have been written, writes that fail because
+    of the connection are retried with exponential backoff. Batches that
+    fail with any other error (e.g. a missing column) are logged and
+    dropped, because retrying them would fail again. At most `max_buffered`
+    rows are buffered, more are logged and dropped.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        query: str,
+        *,
+        batch_size: int,
+        flush_interval: float,
+        max_retries: int,
+        max_buffered: int,
+        on_flush: Optional[Callable[[List[tuple]], Awaitable[None]]] = None
+    ) -> None:
+        """Sets up the writer, without starting it yet."""
+        self.database = database
+        self.query = query
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_buffered = max_buffered
+        self.on_flush = on_flush
+        # Rows dropped because the buffer was full or their batch failed
+        self.dropped_rows = 0
+
+        self._buffer: List[tuple] = []
+        self._lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        """Returns how many rows are waiting to be written."""
+        return len(self._buffer)
+
+    def add(self, row: tuple) -> None:
+        """Buffers a row to be written."""
+        self.add_many((row,))
+
+    def add_many(self, rows: Iterable[tuple]) -> None:
+        """Buffers many rows to be written, dropping them if it's full."""
+        rows = list(rows)
+        room = max(self.max_buffered - len(self._buffer), 0)
+        if len(rows) > room:
+            self.dropped_rows += len(rows) - room
+            logger.error(
+                f"Buffer of query {self.query!r} is full, "
+                f"{len(rows) - room} rows dropped: {rows[room:]}"
+            )
+            rows = rows[:room]
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    def start(self) -> None:
+        """Starts the background task that flushes the buffer."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        """Stops the background task and writes every buffered row."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
+        if self._buffer:
+            logger.error(
+                f"{len(self._buffer)} rows could not be written with query "
+                f"{self.query!r}: {self._buffer}"
+            )
+
+    async def flush(self) -> None:
+        """Writes every buffered row, in batches of `batch_size` rows."""
+        async with self._lock:
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                try:
+                    written = await self._write(batch)
+                except Exception:
+                    # Retrying would fail again, and would block every row
+                    # after the batch
+                    self.dropped_rows += len(batch)
+                    logger.exception(
+                        f"Could not write {len(batch)} rows with query "
+                        f"{self.query!r}, dropped: {batch}"
+                    )
+                    del self._buffer[:len(batch)]
+                    continue
+                if not written:
+                    return
+                # Rows added while writing are after the batch
+                del self._buffer[:len(batch)]
+                if self.on_flush is not None:
+                    await self.on_flush(batch)
+
+    async def _run(self) -> None:
+        """Flushes the buffer when a batch is ready or the interval passes."""
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._batch_ready.wait(),
+                    timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(f"Could not flush query {self.query!r}.")
+
+    async def _write(self, batch: List[tuple]) -> bool:
+        """
+        Writes a batch of rows, retrying with exponential backoff.
+
+        Returns False if the batch could not be written because of the
+        connection, so it is kept in the buffer and retried on the next
+        flush. Other errors are raised.
+        """
+        for attempt in range(self.max_retries):
+            try:
+                await self.database.executemany(self.query, batch)
+            except RETRYABLE_ERRORS as error:
+                delay = 2 ** attempt * 0.5
+                logger.warning(
+                    f"Could not write {len(batch)} rows ({error}), retrying "
+                    f"in {delay} seconds."
+                )
+                await asyncio.sleep(delay)
+            else:
+                return True
+        return False
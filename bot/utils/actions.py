@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+Step = Callable[[], Awaitable[None]]
+
+
+class ActionPipeline:
+    """
+    Runs the side effects of a moderation action.
+
+    Steps added with `then` run one after another, in the order they were
+    added, and the pipeline stops at the first one that fails. Once they are
+    done, steps added with `alongside` run concurrently, and one of them
+    failing doesn't stop the others.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Sets up the pipeline."""
+        self.name = name
+        self._ordered_steps: List[Tuple[str, Step]] = []
+        self._concurrent_steps: List[Tuple[str, Step]] = []
+        # Maps step names to how long they took, in seconds
+        self.latencies: Dict[str, float] = {}
+        # Maps step names to the exception they raised
+        self.failures: Dict[str, BaseException] = {}
+
+    def then(self, name: str, step: Step) -> "ActionPipeline":
+        """Adds a step that runs after the previous ordered steps."""
+        self._ordered_steps.append((name, step))
+        return self
+
+    def alongside(self, name: str, step: Step) -> "ActionPipeline":
+        """Adds a step that runs concurrently after the ordered steps."""
+        self._concurrent_steps.append((name, step))
+        return self
+
+    async def run(self) -> None:
+        """
+        Runs every step.
+
+        The exception of a failing ordered step is raised, failing concurrent
+        steps are logged and kept in `failures`.
+        """
+        start = time.perf_counter()
+        for name, step in self._ordered_steps:
+            await self._run_step(name, step)
+
+        results = await asyncio.gather(
+            *(
+                self._run_step(name, step)
+                for name, step in self._concurrent_steps
+            ),
+            return_exceptions=True
+        )
+        for (name, _), result in zip(self._concurrent_steps, results):
+            if isinstance(result, Exception):
+                self.failures[name] = result
+                logger.error(
+                    f"Step {name!r} of {self.name} failed.",
+                    exc_info=result
+                )
+
+        self.latencies["total"] = time.perf_counter() - start
+        logger.debug(
+            f"{self.name} finished: " + ", ".join(
+                f"{name} {latency * 1000:.0f} ms"
+                for name, latency in self.latencies.items()
+            )
+        )
+
+    async def _run_step(self, name: str, step: Step) -> None:
+        """Runs a step, recording how long it took."""
+        start = time.perf_counter()
+        try:
+            await step()
+        finally:
+            self.latencies[name] = time.perf_counter() - start
@@ -0,0 +1,45 @@
+import math
+from typing import Iterator
+
+
+class BloomFilter:
+    """
+    A set of SHA-256 digests that may have false positives.
+
+    Checking if a digest is in the filter never needs more than a few bit
+    lookups, no matter how many digests were added. If the filter says that
+    a digest isn't in it, it isn't. If it says it is, it probably is, and the
+    real store must be checked.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """Sizes the filter for `capacity` digests with that error rate."""
+        self.size = max(
+            8,
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: bytes) -> Iterator[int]:
+        """Returns the bit positions of a digest, using double hashing."""
+        # A SHA-256 digest is already uniformly distributed, so two halves of
+        # it are used as the two independent hashes
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        return (
+            (first + index * second) % self.size
+            for index in range(self.hash_count)
+        )
+
+    def add(self, digest: bytes) -> None:
+        """Adds a digest to the filter."""
+        for position in self._positions(digest):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        """Returns False if the digest was never added, True if it may be."""
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(digest)
+        )
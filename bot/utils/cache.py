@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """A mapping with a maximum size that evicts the least recently used."""
+
+    def __init__(self, max_size: int) -> None:
+        """Sets up the cache."""
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def __len__(self) -> int:
+        """Returns how many items are cached."""
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Returns True if the key is cached, without marking it as used."""
+        return key in self._items
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns a cached item and marks it as recently used."""
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            return default
+        return self._items[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Caches an item, evicting the least recently used if it's full."""
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        """Removes an item from the cache and returns it."""
+        return self._items.pop(key, default)
+
+    def clear(self) -> None:
+        """Removes every item from the cache."""
+        self._items.clear()
+
+
+class TTLSet:
+    """
+    A set with a maximum size whose items expire after some seconds.
+
+    Items are kept in insertion order, so the expired ones are always at the
+    start and are evicted without scanning the rest. If the set is full, the
+    oldest item is evicted even if it didn't expire yet.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        """Sets up the set."""
+        self.ttl = ttl
+        self.max_size = max_size
+        # Maps items to the monotonic time they expire at
+        self._expiries = OrderedDict()
+
+    def __len__(self) -> int:
+        """Returns how many items are in the set, including expired ones."""
+        return len(self._expiries)
+
+    def __contains__(self, item: Hashable) -> bool:
+        """Returns True if the item is in the set and didn't expire."""
+        expires_at = self._expiries.get(item)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def add(self, item: Hashable) -> None:
+        """Adds an item, or renews it if it's already in the set."""
+        now = time.monotonic()
+        self._expiries[item] = now + self.ttl
+        self._expiries.move_to_end(item)
+        self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Removes the expired items, and the oldest ones if it's full."""
+        expiries = self._expiries
+        while expiries:
+            item, expires_at = next(iter(expiries.items()))
+            if expires_at > now and len(expiries) <= self.max_size:
+                break
+            del expiries[item]
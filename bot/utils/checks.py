@@ -1,7 +1,14 @@
+from typing import Callable, TypeVar
+
+from bot.constants import Roles
+
 from discord.abc import Snowflake
 from discord.ext import commands
 
 
+T = TypeVar("T")
+
+
 def with_role(ctx: commands.Context, *role_ids: Snowflake) -> bool:
     """
     Returns True if the user has any of the roles in role_ids.
@@ -11,8 +18,21 @@ def with_role(ctx: commands.Context, *role_ids: Snowflake) -> bool:
     if not ctx.guild:
         return False
 
-    for role in ctx.author.roles:
-        if role.id in role_ids:
-            return True
-    else:
-        return False
+    return ctx.bot.permissions.has_any_role(ctx.author, role_ids)
+
+
+def has_configured_role(name: str) -> Callable[[T], T]:
+    """
+    Like `commands.has_role`, with the name of a role of the config.
+
+    The ID of the role is read when the command is invoked, so reloading
+    the config changes who can use the command.
+    """
+    # Fails when the cog is loaded if there's no such role
+    getattr(Roles, name)
+
+    def predicate(ctx: commands.Context) -> bool:
+        """Checks the role that is in the config now."""
+        return commands.has_role(getattr(Roles, name)).predicate(ctx)
+
+    return commands.check(predicate)
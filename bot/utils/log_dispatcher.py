@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+from discord import AllowedMentions, Embed, File, HTTPException
+from discord.ext import commands
+from discord.http import Route
+
+
+logger = logging.getLogger(__name__)
+
+# Limits of a single Discord message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS_PER_MESSAGE = 6000
+
+# How long closing waits for the flushers before flushing what is left
+CLOSE_TIMEOUT = 10
+
+
+class LogEntry(NamedTuple):
+    """Something to be sent to a log channel."""
+
+    embed: Optional[Embed]
+    content: Optional[str]
+    file: Optional[File]
+    allowed_mentions: Optional[AllowedMentions]
+    # Monotonic time it was queued at
+    queued_at: float
+
+    @property
+    def is_plain_embed(self) -> bool:
+        """Returns True if the entry only has an embed."""
+        return (
+            self.embed is not None
+            and self.content is None
+            and self.file is None
+            and self.allowed_mentions is None
+        )
+
+
+class LogDispatcher:
+    """
+    Sends log messages, packing many embeds into a single message.
+
+    Entries are queued per channel without waiting for Discord. A flusher
+    task per channel waits `flush_interval` seconds for more entries to
+    arrive, then sends up to 10 embeds per message, one message at a time,
+    so a burst of logs costs a few requests instead of one per entry. If a
+    channel has `max_queue_size` entries waiting, new entries are dropped
+    and a summary with how many were dropped is sent instead.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        *,
+        flush_interval: float,
+        max_queue_size: int
+    ) -> None:
+        """Sets up the dispatcher."""
+        self.bot = bot
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self._queues: Dict[int, Deque[LogEntry]] = {}
+        self._flushers: Dict[int, asyncio.Future] = {}
+        # Maps channel IDs to how many entries were dropped since the last
+        # summary was queued
+        self._dropped: Dict[int, int] = {}
+        self._closing = False
+
+        self._sent_messages = 0
+        self._sent_entries = 0
+        self._dropped_entries = 0
+        self._failed_entries = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+
+    def send(
+        self,
+        channel_id: int,
+        embed: Optional[Embed] = None,
+        *,
+        content: Optional[str] = None,
+        file: Optional[File] = None,
+        allowed_mentions: Optional[AllowedMentions] = None
+    ) -> None:
+        """Queues something to be sent to a channel."""
+        queue = self._queues.setdefault(channel_id, deque())
+        if len(queue) >= self.max_queue_size:
+            self._dropped[channel_id] = self._dropped.get(channel_id, 0) + 1
+            self._dropped_entries += 1
+            return
+
+        queue.append(LogEntry(
+            embed,
+            content,
+            file,
+            allowed_mentions,
+            time.monotonic()
+        ))
+        if channel_id not in self._flushers:
+            self._flushers[channel_id] = asyncio.ensure_future(
+                self._flush_channel(channel_id)
+            )
+
+    async def close(self) -> None:
+        """
+        Sends every queued entry.
+
+        Flushers are given `CLOSE_TIMEOUT` seconds to finish, so a batch
+        isn't lost halfway through being sent. Flushers that are still
+        running after that are stuck on Discord and are cancelled, then the
+        entries left in the queues are sent.
+        """
+        self._closing = True
+        flushers = list(self._flushers.values())
+        self._flushers.clear()
+        if flushers:
+            _, pending = await asyncio.wait(flushers, timeout=CLOSE_TIMEOUT)
+            if pending:
+                logger.warning(
+                    f"{len(pending)} log flushers didn't finish in "
+                    f"{CLOSE_TIMEOUT} seconds and were cancelled."
+                )
+            for flusher in pending:
+                flusher.cancel()
+
+        for channel_id in list(self._queues):
+            await self._flush_queue(channel_id)
+
+    async def _flush_channel(self, channel_id: int) -> None:
+        """Sends the queued entries of a channel, after a short wait."""
+        try:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_queue(channel_id)
+        finally:
+            # Nothing is queued between the queue being emptied and this,
+            # because there is no await in between
+            if not self._closing:
+                self._flushers.pop(channel_id, None)
+
+    async def _flush_queue(self, channel_id: int) -> None:
+        """Sends the queued entries of a channel until none are left."""
+        queue = self._queues[channel_id]
+        while queue or self._dropped.get(channel_id):
+            if not queue:
+                queue.append(self._dropped_summary(channel_id))
+            batch = self._take_batch(queue)
+            try:
+                await self._send_batch(channel_id, batch)
+            except Exception:
+                # Failed requests are handled when sending, this is anything
+                # else, which would otherwise kill the flusher and leave the
+                # channel without one
+                logger.exception(
+                    f"Unexpected error sending {len(batch)} log entries to "
+                    f"channel {channel_id}."
+                )
+                self._failed_entries += len(batch)
+
+    def _dropped_summary(self, channel_id: int) -> LogEntry:
+        """Returns an entry saying how many entries were dropped."""
+        dropped = self._dropped.pop(channel_id)
+        embed = Embed(
+            title="Log entries dropped",
+            description=(
+                f"{dropped} log entries were dropped because too many were "
+                "waiting to be sent."
+            )
+        )
+        return LogEntry(embed, None, None, None, time.monotonic())
+
+    def _take_batch(self, queue: Deque[LogEntry]) -> List[LogEntry]:
+        """
+        Takes the entries that are sent in the next message.
+
+        Only entries that just have an embed are packed together, others are
+        sent alone.
+        """
+        batch = [queue.popleft()]
+        if not batch[0].is_plain_embed:
+            return batch
+
+        characters = len(batch[0].embed)
+        while (
+            queue
+            and len(batch) < MAX_EMBEDS_PER_MESSAGE
+            and queue[0].is_plain_embed
+            and characters + len(queue[0].embed)
+            <= MAX_EMBED_CHARACTERS_PER_MESSAGE
+        ):
+            entry = queue.popleft()
+            characters += len(entry.embed)
+            batch.append(entry)
+        return batch
+
+    async def _send_batch(
+        self,
+        channel_id: int,
+        batch: List[LogEntry]
+    ) -> None:
+        """Sends the entries of a batch in a single message."""
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            logger.warning(
+                f"Log channel {channel_id} not found, {len(batch)} log "
+                "entries were not sent."
+            )
+            self._failed_entries += len(batch)
+            return
+
+        try:
+            if len(batch) == 1:
+                entry = batch[0]
+                await channel.send(
+                    entry.content,
+                    embed=entry.embed,
+                    file=entry.file,
+                    allowed_mentions=entry.allowed_mentions
+                )
+            else:
+                # discord.py 1.x only sends a single embed per message, so
+                # the request is made directly
+                await self.bot.http.request(
+                    Route(
+                        "POST",
+                        "/channels/{channel_id}/messages",
+                        channel_id=channel_id
+                    ),
+                    json={
+                        "embeds": [entry.embed.to_dict() for entry in batch]
+                    }
+                )
+        except HTTPException:
+            logger.exception(
+                f"Could not send {len(batch)} log entries to {channel}."
+            )
+            self._failed_entries += len(batch)
+            return
+
+        latency = time.monotonic() - batch[0].queued_at
+        self._sent_messages += 1
+        self._sent_entries += len(batch)
+        self._total_latency += latency
+        self._max_latency = max(self._max_latency, latency)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns queue depth and flush latency stats."""
+        sent_messages = self._sent_messages or 1
+        return {
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "max_queued": max(
+                (len(queue) for queue in self._queues.values()),
+                default=0
+            ),
+            "sent_messages": self._sent_messages,
+            "sent_entries": self._sent_entries,
+            "dropped_entries": self._dropped_entries,
+            "failed_entries": self._failed_entries,
+            "average_latency_ms": self._total_latency / sent_messages * 1000,
+            "max_latency_ms": self._max_latency * 1000
+        }
@@ -0,0 +1,72 @@
+from collections import Counter
+from typing import FrozenSet, Iterable
+
+from discord import Member
+
+
+def _non_zero(counts: Counter) -> dict:
+    """Returns the counts that aren't zero."""
+    return {key: count for key, count in counts.items() if count}
+
+
+class MemberCounters:
+    """
+    Counts the members of a guild, by status and by some of their roles.
+
+    The counts are kept up to date from member events, so reading them
+    doesn't iterate over the members. `rebuild` counts every member again,
+    to fix counts that drifted because of missed events.
+    """
+
+    def __init__(self, tracked_role_ids: Iterable[int]) -> None:
+        """Sets up the counters, with every count at zero."""
+        self.tracked_role_ids = frozenset(tracked_role_ids)
+        self.members = 0
+        self.statuses = Counter()
+        # Maps IDs of tracked roles to how many members have them
+        self.roles = Counter()
+
+    def _tracked_roles_of(self, member: Member) -> FrozenSet[int]:
+        """Returns the IDs of the tracked roles of a member."""
+        return self.tracked_role_ids.intersection(
+            role.id for role in member.roles
+        )
+
+    def add(self, member: Member) -> None:
+        """Counts a member that joined."""
+        self.members += 1
+        self.statuses[member.status] += 1
+        self.roles.update(self._tracked_roles_of(member))
+
+    def remove(self, member: Member) -> None:
+        """Stops counting a member that left."""
+        self.members -= 1
+        self.statuses[member.status] -= 1
+        self.roles.subtract(self._tracked_roles_of(member))
+
+    def update(self, before: Member, after: Member) -> None:
+        """Updates the counts after the status or the roles of a member."""
+        if before.status is not after.status:
+            self.statuses[before.status] -= 1
+            self.statuses[after.status] += 1
+        if before.roles != after.roles:
+            self.roles.subtract(self._tracked_roles_of(before))
+            self.roles.update(self._tracked_roles_of(after))
+
+    def rebuild(self, members: Iterable[Member]) -> bool:
+        """
+        Counts every member again.
+
+        Returns True if the counts had drifted from the real ones.
+        """
+        previous = (
+            self.members, _non_zero(self.statuses), _non_zero(self.roles)
+        )
+        self.members = 0
+        self.statuses = Counter()
+        self.roles = Counter()
+        for member in members:
+            self.add(member)
+        return previous != (
+            self.members, _non_zero(self.statuses), _non_zero(self.roles)
+        )
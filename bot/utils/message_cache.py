@@ -0,0 +1,356 @@
+import asyncio
+import logging
+import sqlite3
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Set
+
+from discord import Message
+from discord.utils import DISCORD_EPOCH
+
+
+logger = logging.getLogger(__name__)
+
+# Contents shorter than this many bytes are stored uncompressed, zlib
+# doesn't make them smaller
+COMPRESSION_MIN_SIZE = 64
+# Approximate bytes used by a record besides its content: the object, the
+# bytes object of the content and the entry in the cache
+RECORD_OVERHEAD = 200
+# Evicted records are written to the spill file in batches of this size
+SPILL_BATCH_SIZE = 100
+
+
+class CachedMessage:
+    """What is kept of a message, with its content compressed."""
+
+    __slots__ = (
+        "id", "channel_id", "author_id", "created_at", "_content",
+        "_compressed"
+    )
+
+    def __init__(
+        self,
+        message_id: int,
+        channel_id: int,
+        author_id: int,
+        created_at: float,
+        content: str
+    ) -> None:
+        """Creates the record."""
+        self.id = message_id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        # POSIX timestamp, in seconds
+        self.created_at = created_at
+        self.content = content
+
+    @property
+    def content(self) -> str:
+        """The content of the message."""
+        if self._compressed:
+            return zlib.decompress(self._content).decode()
+        return self._content.decode()
+
+    @content.setter
+    def content(self, content: str) -> None:
+        """Compresses and stores the content of the message."""
+        encoded = content.encode()
+        self._compressed = len(encoded) >= COMPRESSION_MIN_SIZE
+        self._content = zlib.compress(encoded) if self._compressed else encoded
+
+    @property
+    def size(self) -> int:
+        """Returns approximately how many bytes the record uses."""
+        return len(self._content) + RECORD_OVERHEAD
+
+    def to_row(self) -> tuple:
+        """Returns the record as a row of the spill file."""
+        return (
+            self.id, self.channel_id, self.author_id, self.created_at,
+            self._content, self._compressed
+        )
+
+
+def _from_row(row: tuple) -> CachedMessage:
+    """Returns the record of a row of the spill file."""
+    record = CachedMessage.__new__(CachedMessage)
+    (
+        record.id, record.channel_id, record.author_id, record.created_at,
+        record._content, compressed
+    ) = row
+    record._compressed = bool(compressed)
+    return record
+
+
+def record_of(message: Message) -> CachedMessage:
+    """Returns the record of a message."""
+    # The creation time is in the ID, in milliseconds since the epoch
+    created_at = ((message.id >> 22) + DISCORD_EPOCH) / 1000
+    return CachedMessage(
+        message.id,
+        message.channel.id,
+        message.author.id,
+        created_at,
+        message.content
+    )
+
+
+class MessageContentCache:
+    """
+    Keeps the content of messages within a memory budget.
+
+    Records are kept in memory until their contents, compressed, use more
+    than `max_bytes`, then the least recently used are evicted. If a spill
+    file is given, evicted records are written to an SQLite database there
+    instead of being forgotten, up to `spill_max_rows` records.
+
+    The spill file is only used from a single thread, so it never blocks
+    the event loop and its queries run in the order they were made.
+    Evicted records are written, and records removed from the spill file
+    are deleted, in batches.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        spill_path: Optional[str] = None,
+        spill_max_rows: int = 0
+    ) -> None:
+        """Sets up the cache, opening the spill file if there is one."""
+        self.max_bytes = max_bytes
+        self.spill_max_rows = spill_max_rows
+        self._records: OrderedDict = OrderedDict()
+        self._bytes = 0
+        # Evicted records that weren't written to the spill file yet
+        self._pending_spill: OrderedDict = OrderedDict()
+        # IDs of records to be deleted from the spill file
+        self._pending_deletes: Set[int] = set()
+        self._flush_task: Optional[asyncio.Future] = None
+        self._spill: Optional[sqlite3.Connection] = None
+        self._spill_thread: Optional[ThreadPoolExecutor] = None
+        if spill_path is not None:
+            self._spill = sqlite3.connect(
+                spill_path,
+                check_same_thread=False
+            )
+            self._spill_thread = ThreadPoolExecutor(max_workers=1)
+            self._spill.execute("PRAGMA journal_mode = WAL")
+            self._spill.execute(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    channel_id INTEGER NOT NULL,
+                    author_id INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    content BLOB NOT NULL,
+                    compressed INTEGER NOT NULL
+                )
+                """
+            )
+
+    def __len__(self) -> int:
+        """Returns how many records are kept in memory."""
+        return len(self._records)
+
+    @property
+    def used_bytes(self) -> int:
+        """Approximately how many bytes the records in memory use."""
+        return self._bytes
+
+    async def _run_in_spill_thread(
+        self,
+        function: Callable[..., Any],
+        *args: Any
+    ) -> Any:
+        """Runs a function that uses the spill file in its thread."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._spill_thread, function, *args)
+
+    def add(self, record: CachedMessage) -> None:
+        """Adds or replaces a record, evicting others if over the budget."""
+        replaced = self._records.pop(record.id, None)
+        if replaced is not None:
+            self._bytes -= replaced.size
+        self._records[record.id] = record
+        self._bytes += record.size
+        self._pending_deletes.discard(record.id)
+        while self._bytes > self.max_bytes and len(self._records) > 1:
+            _, evicted = self._records.popitem(last=False)
+            self._bytes -= evicted.size
+            if self._spill is not None:
+                self._pending_spill[evicted.id] = evicted
+        self._flush_if_full()
+
+    def _flush_if_full(self) -> None:
+        """Starts flushing in the background once a batch is ready."""
+        if self._flush_task is None and (
+            len(self._pending_spill) >= SPILL_BATCH_SIZE
+            or len(self._pending_deletes) >= SPILL_BATCH_SIZE
+        ):
+            self._flush_task = asyncio.ensure_future(self._flush_soon())
+
+    async def _flush_soon(self) -> None:
+        """Flushes the evicted records in the background."""
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Could not write to the spill file.")
+        finally:
+            self._flush_task = None
+
+    def _take(self, message_id: int) -> Optional[CachedMessage]:
+        """Removes a record from memory and returns it, if it's there."""
+        record = self._records.pop(message_id, None)
+        if record is not None:
+            self._bytes -= record.size
+            return record
+        if self._spill is None:
+            return None
+
+        # Deleted from the spill file with the next flush, in case it was
+        # written already
+        self._pending_deletes.add(message_id)
+        self._flush_if_full()
+        return self._pending_spill.pop(message_id, None)
+
+    def _select(self, message_ids: List[int]) -> List[CachedMessage]:
+        """Reads records from the spill file, in the spill thread."""
+        rows = []
+        for start in range(0, len(message_ids), SPILL_BATCH_SIZE):
+            chunk = message_ids[start:start + SPILL_BATCH_SIZE]
+            rows.extend(self._spill.execute(
+                f"""
+                SELECT id, channel_id, author_id, created_at, content,
+                    compressed
+                FROM messages
+                WHERE id IN ({", ".join("?" * len(chunk))})
+                """,
+                chunk
+            ))
+        return [_from_row(row) for row in rows]
+
+    async def get(self, message_id: int) -> Optional[CachedMessage]:
+        """Returns the record of a message and marks it as recently used."""
+        records = await self.get_many((message_id,))
+        return records[0] if records else None
+
+    async def get_many(
+        self,
+        message_ids: Iterable[int]
+    ) -> List[CachedMessage]:
+        """Returns the records that are found of many messages."""
+        records = []
+        missing = []
+        for message_id in message_ids:
+            record = self._records.get(message_id)
+            if record is not None:
+                self._records.move_to_end(message_id)
+            else:
+                record = self._pending_spill.get(message_id)
+            if record is not None:
+                records.append(record)
+            elif (
+                self._spill is not None
+                and message_id not in self._pending_deletes
+            ):
+                missing.append(message_id)
+
+        if missing:
+            records.extend(
+                await self._run_in_spill_thread(self._select, missing)
+            )
+        return records
+
+    def discard(self, message_id: int) -> None:
+        """Removes the record of a message, without reading it."""
+        self._take(message_id)
+
+    async def pop(self, message_id: int) -> Optional[CachedMessage]:
+        """Removes the record of a message and returns it."""
+        records = await self.pop_many((message_id,))
+        return records[0] if records else None
+
+    async def pop_many(
+        self,
+        message_ids: Iterable[int]
+    ) -> List[CachedMessage]:
+        """
+        Removes the records of many messages and returns the ones found.
+
+        Records in the spill file are read with a single call to the spill
+        thread, and deleted with the next flush.
+        """
+        records = []
+        missing = []
+        for message_id in message_ids:
+            # Deleted earlier, so it won't be found in the spill file
+            pending_delete = message_id in self._pending_deletes
+            record = self._take(message_id)
+            if record is not None:
+                records.append(record)
+            elif self._spill is not None and not pending_delete:
+                missing.append(message_id)
+
+        if missing:
+            records.extend(
+                await self._run_in_spill_thread(self._select, missing)
+            )
+        return records
+
+    def _write(
+        self,
+        rows: List[tuple],
+        deleted_ids: List[int]
+    ) -> None:
+        """Writes and deletes records in the spill file, in its thread."""
+        with self._spill:
+            self._spill.executemany(
+                "DELETE FROM messages WHERE id = ?",
+                ((message_id,) for message_id in deleted_ids)
+            )
+            self._spill.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            # Message IDs grow with time, so the oldest records are removed
+            self._spill.execute(
+                """
+                DELETE FROM messages WHERE id <= (
+                    SELECT id FROM messages ORDER BY id DESC
+                    LIMIT 1 OFFSET ?
+                )
+                """,
+                (self.spill_max_rows,)
+            )
+
+    async def flush(self) -> None:
+        """Writes the evicted records and the deletions to the spill file."""
+        if self._spill is None or not (
+            self._pending_spill or self._pending_deletes
+        ):
+            return
+
+        records = list(self._pending_spill.values())
+        deleted_ids = list(self._pending_deletes)
+        self._pending_spill.clear()
+        self._pending_deletes.clear()
+        await self._run_in_spill_thread(
+            self._write,
+            [record.to_row() for record in records],
+            deleted_ids
+        )
+
+    async def close(self) -> None:
+        """Writes the evicted records and closes the spill file."""
+        if self._spill is None:
+            return
+
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+        spill, self._spill = self._spill, None
+        await self._run_in_spill_thread(spill.close)
+        self._spill_thread.shutdown()
+        self._spill_thread = None
@@ -0,0 +1,54 @@
+from typing import Collection, FrozenSet
+
+from bot.constants import Roles, WhitelistedFileExtensions
+from bot.utils.cache import LRUCache
+
+from discord import Member
+
+
+class PermissionIndex:
+    """
+    Precomputed sets for the permission and whitelist checks.
+
+    The sets of the config are built once, and rebuilt with `rebuild` when
+    the config changes. The role IDs of members are cached until
+    `forget_member` is called, when their roles may have changed.
+    """
+
+    def __init__(self, member_cache_size: int) -> None:
+        """Builds the sets."""
+        self._member_role_ids = LRUCache(member_cache_size)
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """Builds the sets from the config."""
+        self.admin_role_ids = frozenset((Roles.admins, Roles.owner))
+        self.whitelisted_extensions = frozenset(
+            extension.lower()
+            for extension in WhitelistedFileExtensions.whitelist
+        )
+        self._member_role_ids.clear()
+
+    def forget_member(self, member_id: int) -> None:
+        """Forgets the cached role IDs of a member."""
+        self._member_role_ids.pop(member_id)
+
+    def forget_all_members(self) -> None:
+        """Forgets the cached role IDs of every member."""
+        self._member_role_ids.clear()
+
+    def member_role_ids(self, member: Member) -> FrozenSet[int]:
+        """Returns the IDs of the roles of a member."""
+        role_ids = self._member_role_ids.get(member.id)
+        if role_ids is None:
+            role_ids = frozenset(role.id for role in member.roles)
+            self._member_role_ids.set(member.id, role_ids)
+        return role_ids
+
+    def has_any_role(self, member: Member, role_ids: Collection[int]) -> bool:
+        """Returns True if the member has any of the roles."""
+        return not self.member_role_ids(member).isdisjoint(role_ids)
+
+    def is_admin(self, member: Member) -> bool:
+        """Returns True if the member has the admins or the owner role."""
+        return self.has_any_role(member, self.admin_role_ids)
@@ -0,0 +1,31 @@
+import time
+from collections import deque
+from typing import Deque
+
+
+class SlidingWindowCounter:
+    """Counts events that happened in the last `window` seconds."""
+
+    def __init__(self, window: float) -> None:
+        """Sets up the counter."""
+        self.window = window
+        # Monotonic times of the events in the window, oldest first
+        self._events: Deque[float] = deque()
+
+    def add(self) -> int:
+        """Counts an event, returning how many are in the window now."""
+        now = time.monotonic()
+        self._events.append(now)
+        self._evict(now)
+        return len(self._events)
+
+    def count(self) -> int:
+        """Returns how many events are in the window."""
+        self._evict(time.monotonic())
+        return len(self._events)
+
+    def _evict(self, now: float) -> None:
+        """Forgets the events that left the window."""
+        events = self._events
+        while events and events[0] <= now - self.window:
+            events.popleft()
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Pattern
+
+from bot.utils.word_filter import WordMatcher, is_offensive
+
+
+logger = logging.getLogger(__name__)
+
+# How many times a scan is tried when the pool is restarted while it runs
+SCAN_ATTEMPTS = 3
+
+# The matcher and the regex of the worker processes, set when they start
+_worker_matcher: Optional[WordMatcher] = None
+_worker_bad_words: Optional[Pattern] = None
+
+
+def _set_up_worker(matcher: WordMatcher, bad_words: Optional[Pattern]) -> None:
+    """Stores the matcher and the regex in a worker process."""
+    global _worker_matcher, _worker_bad_words
+    _worker_matcher = matcher
+    _worker_bad_words = bad_words
+
+
+def _scan_in_worker(content: str) -> bool:
+    """Scans content with the matcher and the regex in a worker process."""
+    return is_offensive(_worker_matcher, _worker_bad_words, content)
+
+
+def _search_in_worker(content: str) -> bool:
+    """Scans content with the regex only in a worker process."""
+    return _worker_bad_words.search(content) is not None
+
+
+def _terminate_workers(pool: ProcessPoolExecutor) -> None:
+    """
+    Terminates the worker processes of a pool.
+
+    There's no public way to stop a call that is already running, even
+    `cancel_futures` only drops the calls that haven't started, so a scan
+    stuck in the regex engine would keep its process busy forever. This
+    reaches into the private process table, which has existed in every
+    version since 3.2, and does nothing if it's ever removed.
+    """
+    processes = getattr(pool, "_processes", None)
+    if not isinstance(processes, dict):
+        logger.warning("Can't terminate the scan workers, they were left.")
+        return
+
+    for process in list(processes.values()):
+        process.terminate()
+
+
+class ScanExecutor:
+    """
+    Scans content for offensive words without blocking the event loop.
+
+    The word matcher runs in linear time, so content shorter than
+    `offload_threshold` characters is matched inline. The regex comes from
+    the config and can backtrack for a very long time even on a short
+    message, so it always runs in a pool of worker processes with a hard
+    timeout, along with the matcher for longer content. Processes are used
+    instead of threads because the regex engine holds the GIL while
+    matching.
+
+    A scan that times out can't be stopped without terminating the worker
+    processes, so the pool is restarted and the scans that were running
+    next to it are scanned again on the new pool.
+    """
+
+    def __init__(
+        self,
+        matcher: WordMatcher,
+        bad_words: Optional[Pattern],
+        *,
+        offload_threshold: int,
+        workers: int,
+        timeout: float
+    ) -> None:
+        """Sets up the executor, the pool is created on the first offload."""
+        self.matcher = matcher
+        self.bad_words = bad_words
+        self.offload_threshold = offload_threshold
+        self.workers = workers
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Bounds how many scans wait for the pool
+        self._pool_slots = asyncio.Semaphore(workers * 2)
+
+        self.inline_scans = 0
+        self.offloaded_scans = 0
+        self.timed_out_scans = 0
+
+    def update(
+        self,
+        matcher: WordMatcher,
+        bad_words: Optional[Pattern]
+    ) -> None:
+        """Replaces the matcher and the regex, restarting the pool."""
+        self.matcher = matcher
+        self.bad_words = bad_words
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        """Stops the worker processes, including busy ones."""
+        if self._pool is None:
+            return
+
+        pool, self._pool = self._pool, None
+        # Shutting down only waits for the running scans to finish, and a
+        # scan that timed out may never finish. The workers are terminated
+        # first since shutting down forgets them.
+        _terminate_workers(pool)
+        if sys.version_info >= (3, 9):
+            pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            pool.shutdown(wait=False)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Returns the pool, creating it if it was stopped."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_set_up_worker,
+                initargs=(self.matcher, self.bad_words)
+            )
+        return self._pool
+
+    async def is_offensive(self, content: str) -> Optional[bool]:
+        """
+        Returns True if the content has offensive words.
+
+        Returns None if the content couldn't be scanned, because its scan
+        timed out or the pool kept being restarted while it was running.
+        """
+        if len(content) >= self.offload_threshold:
+            self.offloaded_scans += 1
+            return await self._scan_in_pool(_scan_in_worker, content)
+
+        self.inline_scans += 1
+        if is_offensive(self.matcher, None, content):
+            return True
+        if self.bad_words is None:
+            return False
+        return await self._scan_in_pool(_search_in_worker, content)
+
+    async def _scan_in_pool(
+        self,
+        scan: Callable[[str], bool],
+        content: str
+    ) -> Optional[bool]:
+        """Runs a scan in the pool, returning None if it couldn't finish."""
+        loop = asyncio.get_event_loop()
+        async with self._pool_slots:
+            for _ in range(SCAN_ATTEMPTS):
+                pool = self._get_pool()
+                try:
+                    return await asyncio.wait_for(
+                        loop.run_in_executor(pool, scan, content),
+                        timeout=self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.timed_out_scans += 1
+                    logger.warning(
+                        f"Scanning {len(content)} characters took more than "
+                        f"{self.timeout} seconds, the scan was stopped."
+                    )
+                    # The pool may have been restarted by another scan
+                    if self._pool is pool:
+                        self.shutdown()
+                    return None
+                except BrokenProcessPool:
+                    # Restarted by another scan that timed out, or by an
+                    # update, this content is fine to scan again
+                    pass
+
+        logger.warning(
+            f"The scan of {len(content)} characters was stopped "
+            f"{SCAN_ATTEMPTS} times because the pool was restarted."
+        )
+        return None
@@ -0,0 +1,126 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# How many callbacks run at once by default
+DEFAULT_CONCURRENCY = 10
+
+
+class ExpiryQueue:
+    """
+    Calls a callback when scheduled items expire.
+
+    Items are kept in a min-heap ordered by expiry time, and a single task
+    sleeps until the next item is due, no matter how many items are
+    scheduled. Items that are already due when scheduled expire right away.
+    At most `concurrency` callbacks run at once, so a backlog of due items
+    (e.g. after a restart) is expired a few at a time.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[Hashable, Any], Awaitable[None]],
+        *,
+        concurrency: int = DEFAULT_CONCURRENCY
+    ) -> None:
+        """Sets up the queue, without starting it yet."""
+        self.callback = callback
+        self._slots = asyncio.Semaphore(concurrency)
+        self._heap: List[list] = []
+        # Maps keys to their heap entries, cancelled entries are left in the
+        # heap and skipped when they reach the top
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        """Returns how many items are scheduled."""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Returns True if an item with that key is scheduled."""
+        return key in self._entries
+
+    def schedule(
+        self,
+        key: Hashable,
+        when: datetime,
+        payload: Any = None
+    ) -> None:
+        """Schedules an item, replacing any item with the same key."""
+        entry = [when.timestamp(), next(self._counter), key, payload]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        # Only wake up the sleeper if it has to sleep less now
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> None:
+        """Cancels a scheduled item, if it's scheduled."""
+        self._entries.pop(key, None)
+
+    def start(self) -> None:
+        """Starts the task that waits for items to expire."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self) -> None:
+        """Stops the task that waits for items to expire."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        """Sleeps until the next item is due and expires it."""
+        while True:
+            while self._heap and self._is_cancelled(self._heap[0]):
+                heapq.heappop(self._heap)
+
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Waits for a callback to finish if too many are running, the
+            # heap may change meanwhile so it's checked again
+            await self._slots.acquire()
+            if (
+                not self._heap
+                or self._is_cancelled(self._heap[0])
+                or self._heap[0][0] > time.time()
+            ):
+                self._slots.release()
+                continue
+
+            _, _, key, payload = heapq.heappop(self._heap)
+            del self._entries[key]
+            asyncio.ensure_future(self._expire(key, payload))
+
+    def _is_cancelled(self, entry: list) -> bool:
+        """Returns True if a heap entry was cancelled or replaced."""
+        return self._entries.get(entry[2]) is not entry
+
+    async def _expire(self, key: Hashable, payload: Any) -> None:
+        """Calls the callback for an expired item."""
+        try:
+            await self.callback(key, payload)
+        except Exception:
+            logger.exception(f"Could not expire {key!r}.")
+        finally:
+            self._slots.release()
@@ -0,0 +1,152 @@
+import hashlib
+import logging
+from typing import FrozenSet, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+from bot.utils.cache import LRUCache
+
+from discord import Attachment
+
+
+logger = logging.getLogger(__name__)
+
+# How many bytes of every attachment are downloaded to detect its type
+SNIFF_SIZE = 4096
+# Attachments are read in chunks of this many bytes
+CHUNK_SIZE = 65536
+SNIFF_TIMEOUT = aiohttp.ClientTimeout(total=30)
+
+# Signatures of file types, as (offset, magic bytes, file type)
+SIGNATURES: Tuple[Tuple[int, bytes, str], ...] = (
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"\x1a\x45\xdf\xa3", "matroska"),
+    (4, b"ftyp", "mp4"),
+    (0, b"\x00\x00\x01\xba", "mpeg"),
+    (0, b"\x00\x00\x01\xb3", "mpeg"),
+    (8, b"AVI ", "avi"),
+    (8, b"WAVE", "wav"),
+    (0, b"ID3", "mp3"),
+    (0, b"OggS", "ogg"),
+    (0, b"gimp xcf", "xcf"),
+    (0, b"II*\x00", "tiff"),
+    (0, b"MM\x00*", "tiff"),
+    (0, b"MZ", "executable"),
+    (0, b"\x7fELF", "executable"),
+    (0, b"\xca\xfe\xba\xbe", "executable"),
+    (0, b"\xcf\xfa\xed\xfe", "executable"),
+    (0, b"PK\x03\x04", "archive"),
+    (0, b"Rar!\x1a\x07", "archive"),
+    (0, b"7z\xbc\xaf\x27\x1c", "archive"),
+    (0, b"#!", "script")
+)
+
+# Extensions that every detected file type may have
+EXTENSIONS = {
+    "png": frozenset((".png",)),
+    "jpeg": frozenset((".jpg", ".jpeg")),
+    "gif": frozenset((".gif",)),
+    "matroska": frozenset((".mkv", ".webm")),
+    "mp4": frozenset((".mp4", ".mov", ".m4v")),
+    "mpeg": frozenset((".mpeg", ".mpg")),
+    "avi": frozenset((".avi",)),
+    "wav": frozenset((".wav",)),
+    "mp3": frozenset((".mp3",)),
+    "ogg": frozenset((".ogg",)),
+    "xcf": frozenset((".xcf",)),
+    "tiff": frozenset((".tiff",)),
+    "svg": frozenset((".svg",))
+}
+
+
+def detect_file_type(head: bytes) -> Optional[str]:
+    """Returns the type of a file from its first bytes, or None."""
+    for offset, magic, file_type in SIGNATURES:
+        if head.startswith(magic, offset):
+            return file_type
+
+    # MP3 files without ID3 tags start with a frame sync
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "mp3"
+
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith(b"<svg") or (
+        text.startswith(b"<?xml") and b"<svg" in text
+    ):
+        return "svg"
+    return None
+
+
+def extensions_of(file_type: Optional[str]) -> FrozenSet[str]:
+    """Returns the extensions that a detected file type may have."""
+    return EXTENSIONS.get(file_type, frozenset())
+
+
+class SniffResult(NamedTuple):
+    """What is known about the content of an attachment."""
+
+    # None if the type is unknown
+    file_type: Optional[str]
+    # Identifies the content of the attachment, see `fingerprint_of`
+    fingerprint: bytes
+
+
+def fingerprint_of(size: int, head: bytes) -> bytes:
+    """
+    Returns the fingerprint of a file from its size and its first bytes.
+
+    It's the SHA-256 digest of the size and the first `SNIFF_SIZE` bytes,
+    so it's computed from the same bounded read as the type, for files of
+    any size. Files of up to `SNIFF_SIZE` bytes are fingerprinted whole.
+    Bigger files with the same size and the same first bytes have the same
+    fingerprint, which is unlikely for different media files.
+    """
+    return hashlib.sha256(size.to_bytes(8, "big") + head).digest()
+
+
+class AttachmentSniffer:
+    """
+    Detects the type of attachments and fingerprints them.
+
+    Only the first `SNIFF_SIZE` bytes of attachments are downloaded, so the
+    bandwidth used per attachment doesn't depend on its size. Results are
+    cached by attachment ID and size.
+    """
+
+    def __init__(self, cache_size: int) -> None:
+        """Sets up the sniffer."""
+        self._results = LRUCache(cache_size)
+
+    async def sniff(
+        self,
+        session: aiohttp.ClientSession,
+        attachment: Attachment
+    ) -> SniffResult:
+        """Returns the type and the fingerprint of an attachment."""
+        key = (attachment.id, attachment.size)
+        if key in self._results:
+            return self._results.get(key)
+
+        head = b""
+        async with session.get(
+            attachment.url,
+            headers={"Range": f"bytes=0-{SNIFF_SIZE - 1}"},
+            timeout=SNIFF_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            # If the server ignores the range, the rest of the file isn't
+            # downloaded because the response is closed after this
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                head += chunk[:SNIFF_SIZE - len(head)]
+                if len(head) >= SNIFF_SIZE:
+                    break
+
+        result = SniffResult(
+            detect_file_type(head),
+            fingerprint_of(attachment.size, head)
+        )
+        self._results.set(key, result)
+        return result
@@ -0,0 +1,60 @@
+import gzip
+import io
+import json
+from datetime import datetime
+from typing import Iterable
+
+from bot.utils.message_cache import CachedMessage
+
+from discord import Message
+
+
+def message_record(message: Message) -> dict:
+    """Returns what a transcript keeps of a message."""
+    return {
+        "id": message.id,
+        "channel_id": message.channel.id,
+        "author_id": message.author.id,
+        "author": str(message.author),
+        "created_at": message.created_at.isoformat(),
+        "edited_at": (
+            message.edited_at.isoformat()
+            if message.edited_at is not None
+            else None
+        ),
+        "content": message.content,
+        "attachments": [attachment.url for attachment in message.attachments],
+        "embeds": len(message.embeds)
+    }
+
+
+def cached_message_record(message: CachedMessage) -> dict:
+    """Returns what a transcript keeps of a message of the content cache."""
+    return {
+        "id": message.id,
+        "channel_id": message.channel_id,
+        "author_id": message.author_id,
+        "author": None,
+        "created_at": datetime.utcfromtimestamp(
+            message.created_at
+        ).isoformat(),
+        "edited_at": None,
+        "content": message.content,
+        "attachments": [],
+        "embeds": None
+    }
+
+
+def build_transcript(records: Iterable[dict]) -> io.BytesIO:
+    """
+    Returns a gzip compressed transcript with a JSON record per line.
+
+    Records are compressed as they are written, so the whole uncompressed
+    transcript is never kept in memory.
+    """
+    transcript = io.BytesIO()
+    with gzip.GzipFile(fileobj=transcript, mode="wb") as compressed:
+        for record in records:
+            compressed.write(json.dumps(record).encode() + b"\n")
+    transcript.seek(0)
+    return transcript
@@ -0,0 +1,204 @@
+import logging
+import re
+import unicodedata
+from collections import deque
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Invisible characters used to split words
+_INVISIBLE_CHARACTERS = (
+    0x00AD, 0x034F, 0x180E, 0x200B, 0x200C, 0x200D, 0x200E, 0x200F, 0x2060,
+    0x2061, 0x2062, 0x2063, 0x2064, 0xFEFF
+)
+# Blocks of combining marks, used to hide words under diacritics
+_COMBINING_BLOCKS = (
+    range(0x0300, 0x0370),
+    range(0x1AB0, 0x1B00),
+    range(0x1DC0, 0x1E00),
+    range(0x20D0, 0x2100),
+    range(0xFE20, 0xFE30)
+)
+# Lowercase characters of other scripts that look like latin letters
+_CONFUSABLES = {
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s",
+    "і": "i", "ї": "i", "ј": "j", "һ": "h", "ԁ": "d", "ԛ": "q", "ԝ": "w",
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v",
+    "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x", "ɡ": "g", "ɑ": "a",
+    "ı": "i", "ȷ": "j", "ʏ": "y", "ᴀ": "a", "ʙ": "b", "ᴄ": "c", "ᴅ": "d",
+    "ᴇ": "e", "ɢ": "g", "ʜ": "h", "ɪ": "i", "ᴊ": "j", "ᴋ": "k", "ʟ": "l",
+    "ᴍ": "m", "ɴ": "n", "ᴏ": "o", "ᴘ": "p", "ʀ": "r", "ᴛ": "t", "ᴜ": "u",
+    "ᴠ": "v", "ᴡ": "w", "ᴢ": "z"
+}
+
+FOLDING_TABLE = str.maketrans({
+    **dict.fromkeys(_INVISIBLE_CHARACTERS),
+    **dict.fromkeys(
+        code_point
+        for block in _COMBINING_BLOCKS
+        for code_point in block
+        if unicodedata.category(chr(code_point)).startswith("M")
+    ),
+    **_CONFUSABLES
+})
+LEETSPEAK_TABLE = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s"
+})
+# Runs of three or more of the same character
+LONG_RUNS_REGEX = re.compile(r"(.)\1{2,}")
+# Runs of two or more of the same character
+RUNS_REGEX = re.compile(r"(.)\1+")
+
+
+def normalize(text: str) -> List[str]:
+    """
+    Returns the variants of a text that are checked for offensive words.
+
+    The text is normalized with NFKD, so accented letters are split into a
+    letter and combining marks, lowercased, stripped of invisible characters
+    and combining marks, and has characters that look like latin letters
+    replaced with them. Runs of a character are shortened to two characters
+    in a variant, so `asss` is still `ass`, and to one character in another
+    one, so `fuuuck` is `fuck`. Variants with leetspeak replaced with letters
+    are also returned. Variants are only returned once.
+    """
+    folded = unicodedata.normalize("NFKD", text).lower()
+    folded = folded.translate(FOLDING_TABLE)
+    variants = []
+    for shortened in (
+        LONG_RUNS_REGEX.sub(r"\1\1", folded),
+        RUNS_REGEX.sub(r"\1", folded)
+    ):
+        variants.append(shortened)
+        variants.append(shortened.translate(LEETSPEAK_TABLE))
+    return list(dict.fromkeys(variants))
+
+
+class WordMatcher:
+    """
+    Finds words of a word list in text with an Aho-Corasick automaton.
+
+    Every word is matched in a single pass over the text, no matter how many
+    words there are. Matching is case insensitive and, by default, words
+    only match whole words of the text. A `*` at the start or at the end of a
+    word means that it can also match inside of a longer word at that side,
+    e.g. `*word*` matches `swordfish`.
+    """
+
+    def __init__(self, words: Iterable[str]) -> None:
+        """Builds the automaton."""
+        # Transitions, failure links and outputs of every node of the trie.
+        # Outputs are tuples of (word, needs left boundary, needs right
+        # boundary).
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, bool, bool]]] = [[]]
+        self._words = 0
+
+        for word in words:
+            self._add_word(word)
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        """Returns how many words are matched."""
+        return self._words
+
+    def _add_word(self, word: str) -> None:
+        """Adds a word to the trie."""
+        word = word.strip()
+        left_boundary = not word.startswith("*")
+        right_boundary = not word.endswith("*")
+        word = word.strip("*").lower()
+        if not word:
+            return
+
+        node = 0
+        for character in word:
+            next_node = self._goto[node].get(character)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][character] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((word, left_boundary, right_boundary))
+        self._words += 1
+
+    def _build_failure_links(self) -> None:
+        """Links every node to the node of its longest proper suffix."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for character, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and character not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(character, 0)
+                self._fail[child] = fail if fail != child else 0
+                # Words ending at the suffix also end here
+                self._output[child] = (
+                    self._output[child] + self._output[self._fail[child]]
+                )
+
+    def find(self, text: str) -> Optional[str]:
+        """Returns the first word found in the text, or None."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        text = text.lower()
+        length = len(text)
+
+        node = 0
+        for index, character in enumerate(text):
+            while node and character not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(character, 0)
+            if not output[node]:
+                continue
+
+            for word, left_boundary, right_boundary in output[node]:
+                start = index - len(word) + 1
+                if left_boundary and start > 0 and text[start - 1].isalnum():
+                    continue
+                if (
+                    right_boundary
+                    and index + 1 < length
+                    and text[index + 1].isalnum()
+                ):
+                    continue
+                return word
+        return None
+
+
+def load_word_matcher(path: str) -> WordMatcher:
+    """
+    Builds a word matcher from a file with a word per line.
+
+    Empty lines and lines starting with `#` are ignored.
+    """
+    with open(path, encoding="utf-8") as words_file:
+        matcher = WordMatcher(
+            line for line in words_file
+            if not line.startswith("#")
+        )
+    logger.info(f"{len(matcher)} offensive words loaded from {path}.")
+    return matcher
+
+
+def is_offensive(
+    matcher: WordMatcher,
+    bad_words: Optional[Pattern],
+    content: str
+) -> bool:
+    """Returns True if the normalized content has offensive words."""
+    return any(
+        matcher.find(variant) is not None
+        for variant in normalize(content)
+    ) or (
+        bad_words is not None and bad_words.search(content) is not None
+    )
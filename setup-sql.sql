@@ -5,5 +5,55 @@ CREATE TABLE infractions(
     action VARCHAR(8) NOT NULL,
     inserted_at TIMESTAMPTZ NOT NULL,
     expires_at TIMESTAMPTZ,
+    reason VARCHAR(512),
+    expired BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- Infraction history lookups page by ID, newest first
+CREATE INDEX infractions_bad_actor_id_idx ON infractions (bad_actor_id, id DESC);
+CREATE INDEX infractions_moderator_id_idx ON infractions (moderator_id, id DESC);
+CREATE INDEX infractions_inserted_at_idx ON infractions (inserted_at);
+
+-- Pending expirations are loaded by the scheduler on startup
+CREATE INDEX infractions_expires_at_idx ON infractions (expires_at)
+    WHERE expires_at IS NOT NULL AND NOT expired;
+
+-- Known malicious files. fingerprint is the SHA-256 digest of the size of a
+-- file and its first 4 KiB.
+CREATE TABLE attachment_blocklist(
+    fingerprint BYTEA PRIMARY KEY,
+    moderator_id BIGINT NOT NULL,
+    inserted_at TIMESTAMPTZ NOT NULL,
     reason VARCHAR(512)
-)
+);
+
+-- Deleted and edited messages seen by the message logs. content is the
+-- content before the deletion or the edit, new_content the content after
+-- an edit.
+CREATE TABLE message_logs(
+    id BIGSERIAL PRIMARY KEY,
+    event VARCHAR(8) NOT NULL,
+    message_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    author_id BIGINT,
+    logged_at TIMESTAMPTZ NOT NULL,
+    content TEXT NOT NULL,
+    new_content TEXT
+);
+
+-- Searches filter by author or channel, newest first
+CREATE INDEX message_logs_author_id_idx ON message_logs (author_id, logged_at DESC);
+CREATE INDEX message_logs_channel_id_idx ON message_logs (channel_id, logged_at DESC);
+CREATE INDEX message_logs_logged_at_idx ON message_logs (logged_at);
+
+-- Full-text search of the content, the expression must match the queries
+CREATE INDEX message_logs_content_idx ON message_logs
+    USING GIN (to_tsvector('simple', content));
+
+-- Silenced channels, so their silences still expire after a restart
+CREATE TABLE silences(
+    channel_id BIGINT PRIMARY KEY,
+    moderator_id BIGINT NOT NULL,
+    inserted_at TIMESTAMPTZ NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);